@@ -0,0 +1,69 @@
+'''
+Compares the graph construction of :class:`proteinshake.representations.GraphDataset` (batched KD-tree queries, see :meth:`proteinshake.representations.graph.neighbor_graphs`) with the per-protein construction with scikit-learn, at residue and atom resolution.
+
+Usage: python benchmarks/graph_construction.py [--num_proteins 200] [--length 300] [--batch_size 64]
+
+Proteins are simulated as random walks with C-alpha spacing (residue resolution) and a cloud of 8 atoms around each residue (atom resolution), unless a dataset is given with --dataset, e.g. --dataset EnzymeCommissionDataset --root data.
+'''
+import argparse, time
+import numpy as np
+from sklearn.neighbors import kneighbors_graph, radius_neighbors_graph
+from proteinshake.representations.graph import neighbor_graphs, protein_coords
+
+def simulate(num_proteins, length, seed=0):
+    rng = np.random.default_rng(seed)
+    residues, atoms = [], []
+    for _ in range(num_proteins):
+        n = rng.integers(length // 2, length * 3 // 2)
+        steps = rng.normal(size=(n, 3))
+        coords = np.cumsum(3.8 * steps / np.linalg.norm(steps, axis=1, keepdims=True), axis=0)
+        residues.append(coords)
+        atoms.append((coords[:, None] + rng.normal(scale=1.5, size=(n, 8, 3))).reshape(-1, 3))
+    return residues, atoms
+
+def load_dataset(name, root, num_proteins):
+    import itertools
+    import proteinshake.datasets
+    ds = getattr(proteinshake.datasets, name)(root=root, verbosity=0)
+    return [[protein_coords(p) for p in itertools.islice(ds.proteins(resolution=resolution), num_proteins)] for resolution in ['residue', 'atom']]
+
+def sklearn_graphs(coords, construction, k=None, eps=None, weighted_edges=False):
+    mode = 'distance' if weighted_edges else 'connectivity'
+    if construction == 'eps':
+        return [radius_neighbors_graph(c, radius=eps, mode=mode) for c in coords]
+    return [kneighbors_graph(c, n_neighbors=min(len(c) - 1, k), mode=mode) for c in coords]
+
+def batched_graphs(coords, construction, k=None, eps=None, weighted_edges=False, batch_size=64):
+    return [adj for i in range(0, len(coords), batch_size) for adj in neighbor_graphs(coords[i:i+batch_size], construction, k=k, eps=eps, weighted_edges=weighted_edges)]
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the graph construction.')
+    parser.add_argument('--num_proteins', type=int, default=200)
+    parser.add_argument('--length', type=int, default=300, help='The average number of residues of the simulated proteins.')
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--dataset', type=str, default=None)
+    parser.add_argument('--root', type=str, default='data')
+    args = parser.parse_args()
+
+    if args.dataset is None:
+        residues, atoms = simulate(args.num_proteins, args.length)
+    else:
+        residues, atoms = load_dataset(args.dataset, args.root, args.num_proteins)
+    settings = [
+        ('residue', residues, 'knn', {'k': 16}),
+        ('residue', residues, 'eps', {'eps': 8.0}),
+        ('atom', atoms, 'knn', {'k': 16}),
+        ('atom', atoms, 'eps', {'eps': 4.5}),
+    ]
+    print(f'{"resolution":<12}{"graph":<10}{"nodes":>10}{"edges":>12}{"sklearn [s]":>14}{"batched [s]":>14}{"speedup":>10}')
+    for resolution, coords, construction, params in settings:
+        reference_time, reference = timed(sklearn_graphs, coords, construction, weighted_edges=True, **params)
+        batched_time, batched = timed(batched_graphs, coords, construction, weighted_edges=True, batch_size=args.batch_size, **params)
+        assert all(a.shape == b.shape and a.nnz == b.nnz for a, b in zip(reference, batched))
+        nodes, edges = sum(len(c) for c in coords), sum(a.nnz for a in batched)
+        print(f'{resolution:<12}{construction + str(list(params.values())[0]):<10}{nodes:>10}{edges:>12}{reference_time:>14.3f}{batched_time:>14.3f}{reference_time / batched_time:>9.1f}x')
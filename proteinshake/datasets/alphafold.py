@@ -1,10 +1,10 @@
 import os
 import re
 import tarfile
-import glob
+import itertools
 
 from proteinshake.datasets import Dataset
-from proteinshake.utils import download_url, extract_tar, load, save, unzip_file, progressbar
+from proteinshake.utils import download_url, list_tar, load, save
 
 # A map of organism names to their download file names. See https://alphafold.ebi.ac.uk/download
 AF_DATASET_NAMES = {
@@ -35,6 +35,7 @@ class AlphaFoldDataset(Dataset):
     See https://alphafold.ebi.ac.uk/download for a full list of available organsims.
     Pass the full latin organism name separated by a space or underscore.
     `organism` can also be 'swissprot', in which case the full SwissProt structure predictions will be downloaded (ca. 500.000).
+    The residues and atoms have the AlphaFold confidence as an additional attribute `pLDDT` (see :meth:`~proteinshake.datasets.Dataset.stage_plddt`). Datasets parsed with earlier versions, including precomputed datasets released before it was added, do not have this attribute.
 
     .. admonition:: Please cite
 
@@ -95,6 +96,7 @@ class AlphaFoldDataset(Dataset):
     """
 
     exlude_args_from_signature = ['organism']
+    parse_stages = ['coordinates', 'sasa', 'plddt', 'protein_attributes']
 
     def __init__(self, organism='swissprot', version='v4', only_single_chain=True, **kwargs):
         self.organism = organism.lower().replace(' ','_')
@@ -107,13 +109,29 @@ class AlphaFoldDataset(Dataset):
         return f'{self.__class__.__name__}_{self.organism}'
 
     def get_raw_files(self):
-        return glob.glob(f'{self.root}/raw/*/*.pdb')[:self.limit]
+        # the structures are read directly from the proteome archive, without extracting it
+        tar_path = f'{self.root}/raw/{self.organism}/{AF_DATASET_NAMES[self.organism]}_{self.version}.tar'
+        return [path for path in list_tar(tar_path) if path.endswith('.pdb.gz')][:self.limit]
+
+    def iter_raw_files(self):
+        """ Streams the PDB files from the proteome archive. The archive is read sequentially in a single pass, and each `.pdb.gz` member is handed to the parser in memory, so that parsing starts immediately and no member is written to disk. Other members (mmCIF files and confidence JSONs) are skipped without reading them.
+
+        Returns
+        -------
+        generator
+            The `(path, data)` tuples of the first `limit` PDB files.
+        """
+        tar_path = f'{self.root}/raw/{self.organism}/{AF_DATASET_NAMES[self.organism]}_{self.version}.tar'
+        def stream():
+            with tarfile.open(tar_path, 'r|*') as archive:
+                for member in archive:
+                    if member.isfile() and member.name.endswith('.pdb.gz'):
+                        yield f'{tar_path}/{member.name}', archive.extractfile(member).read()
+        return itertools.islice(stream(), self.limit)
 
     def get_id_from_filename(self, filename):
         return re.search('(?<=AF-)(.*)(?=-F.+-model)', filename).group()
 
     def download(self):
         os.makedirs(f'{self.root}/raw/{self.organism}', exist_ok=True)
-        download_url(self.base_url+AF_DATASET_NAMES[self.organism]+f'_{self.version}.tar', f'{self.root}/raw/{self.organism}', verbosity=self.verbosity)
-        extract_tar(f'{self.root}/raw/{self.organism}/{AF_DATASET_NAMES[self.organism]}_{self.version}.tar', f'{self.root}/raw/{self.organism}', verbosity=self.verbosity)
-        [unzip_file(f) for f in progressbar(glob.glob(f'{self.root}/raw/*/*.pdb.gz')[:self.limit], desc='Unzipping', verbosity=self.verbosity)]
+        download_url(self.base_url+AF_DATASET_NAMES[self.organism]+f'_{self.version}.tar', f'{self.root}/raw/{self.organism}', verbosity=self.verbosity, segments=4)
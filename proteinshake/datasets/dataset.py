@@ -2,22 +2,23 @@
 """
 Base dataset class for protein 3D structures.
 """
-import os, gzip, inspect, time, itertools, tarfile, io, requests
+import os, gzip, inspect, time, itertools, tarfile, io, requests, hashlib
 import copy
-from collections import defaultdict, Counter
+from collections import defaultdict, Counter, deque
 from functools import cached_property
 import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 import numpy as np
 import freesasa
 from biopandas.pdb import PandasPdb
-from joblib import Parallel, delayed
+from joblib import effective_n_jobs
 from sklearn.neighbors import kneighbors_graph, radius_neighbors_graph
 from fastavro import reader as avro_reader
 
 from proteinshake.transforms import IdentityTransform, RandomRotateTransform, CenterTransform
-from proteinshake.utils import download_url, save, load, unzip_file, write_avro, Generator, progressbar, warning, error
+from proteinshake.utils import download_url, save, load, AvroWriter, load_avro_index, read_avro_record, read_avro_records, write_columns, load_columns, read_pdb_atoms, read_cif_atoms, read_bcif_atoms, read_raw_file, share_proteins, load_shared_proteins, free_shared_proteins, get_http_cache, BulkDownloader, Generator, progressbar, warning, error
 
 AA_THREE_TO_ONE = {'ALA': 'A', 'CYS': 'C', 'ASP': 'D', 'GLU': 'E', 'PHE': 'F', 'GLY': 'G', 'HIS': 'H', 'ILE': 'I', 'LYS': 'K', 'LEU': 'L', 'MET': 'M', 'ASN': 'N', 'PRO': 'P', 'GLN': 'Q', 'ARG': 'R', 'SER': 'S', 'THR': 'T', 'VAL': 'V', 'TRP': 'W', 'TYR': 'Y'}
 AA_ONE_TO_THREE = {v:k for k, v in AA_THREE_TO_ONE.items()}
@@ -27,6 +28,22 @@ RELEASES = {
     'latest': '1212262',
 }
 
+def init_parse_worker(dataset):
+    """ Initializes a parse worker process with the dataset, see :meth:`Dataset.parse_chunks`. """
+    global parse_worker_dataset
+    parse_worker_dataset = dataset
+
+def parse_chunk(items):
+    """ Parses a chunk of PDB files in a worker process and packs the proteins into shared memory, see :meth:`Dataset.parse_chunks`. """
+    results = [parse_worker_dataset.parse_pdb_timed(path, data=data) for path, data in items]
+    return share_proteins([protein for protein, _ in results]), [timings for _, timings in results]
+
+def select_attributes(protein, resolution, attributes=None):
+    """ Returns a protein with only the given residue or atom level attributes, see :meth:`Dataset.proteins`. """
+    if attributes is None:
+        return protein
+    return {'protein': protein['protein'], resolution: {name: protein[resolution][name] for name in attributes}}
+
 class Dataset():
     """ Base dataset class.
     Holds the logic for downloading and parsing PDB files.
@@ -99,11 +116,21 @@ class Dataset():
         Exclude PDB IDs from the dataset.
     skip_signature_check: bool, default False
         If True, skips the signature check. 
+    pdb_parser: str, default 'biopandas'
+        The parser used to read PDB files in :meth:`pdb2df`. 'biopandas' uses biopandas, 'native' uses a vectorized fixed-column parser (:meth:`proteinshake.utils.read_pdb_atoms`) which produces identical proteins and is several times faster.
+    parse_cache: bool, default False
+        If `True`, every parsed PDB file is cached in `{root}/parse_cache`, keyed on the file path, modification time, size, and the dataset signature. An interrupted or repeated :meth:`parse` then only parses new or changed files.
+    storage: str, default 'avro'
+        The storage format that proteins are read from. With 'avro', proteins are decoded from the avro file into Python lists. With 'npy', the avro file is converted once to columnar storage (one contiguous array per attribute over the whole dataset) which is memory-mapped, and proteins hold zero-copy NumPy views into these arrays. If the precomputed dataset has a column release, only the requested attributes are downloaded instead of the avro file (see :meth:`fetch_columns`).
+    exclude_stages: list, default []
+        Feature stages of :meth:`parse_pdb` to skip when processing the dataset locally, e.g. `['sasa']` to build a dataset without `SASA` and `RSA`, which is considerably faster. See `parse_stages` for the stages of a dataset. The time spent in each stage is reported after parsing.
     verbosity: int, default 2
         Verbosity level of output logging. 2: full output, 1: no progress bars, 0: only warnings and errors, -1: only errors, -2: no output.
     """
 
     additional_files = [] # indicates the additional file names that are to be included in the release
+    parse_stages = ['coordinates', 'sasa', 'protein_attributes'] # feature stages of parse_pdb, each implemented by a `stage_{name}` method
+    parse_chunk_size = 32 # maximum number of files a parse worker processes per task
     exlude_args_from_signature = []
 
     def __init__(self,
@@ -117,6 +144,10 @@ class Dataset():
             maximum_length                 = 2048,
             exclude_ids                    = [],
             skip_signature_check           = False,
+            pdb_parser                     = 'biopandas',
+            parse_cache                    = False,
+            storage                        = 'avro',
+            exclude_stages                 = [],
             verbosity                      = 2,
             # center                         = True, Put back after submission
             # random_rotate                  = True
@@ -137,7 +168,16 @@ class Dataset():
         self.release = release
         self.exclude_ids = exclude_ids
         self.skip_signature_check = skip_signature_check
+        if not pdb_parser in ['biopandas', 'native']: error(f'Unknown PDB parser {pdb_parser}. Use one of biopandas or native.', verbosity=verbosity)
+        self.pdb_parser = pdb_parser
+        self.parse_cache = parse_cache
+        if not storage in ['avro', 'npy']: error(f'Unknown storage format {storage}. Use one of avro or npy.', verbosity=verbosity)
+        self.storage = storage
+        if any(not stage in self.parse_stages for stage in exclude_stages): error(f'Unknown parse stage in {exclude_stages}. Use any of {", ".join(self.parse_stages)}.', verbosity=verbosity)
+        self.exclude_stages = exclude_stages
         self.verbosity = verbosity
+        self._avro_index = {}
+        self._columns = {}
         
         os.makedirs(f'{self.root}', exist_ok=True)
         #self.check_signature()
@@ -152,7 +192,10 @@ class Dataset():
         return os.path.exists(f'{self.root}/{self.name}.residue.avro') or os.path.exists(f'{self.root}/{self.name}.atom.avro')
     
     def precomputed_available(self):
-        return requests.head(f'{self.repository_url}/{self.name}.residue.avro.gz', timeout=5).status_code == 200
+        try:
+            return get_http_cache().request('HEAD', f'{self.repository_url}/{self.name}.residue.avro.gz', timeout=5).status_code == 200
+        except requests.ConnectionError:
+            return False
 
     def compute_signature(self, use_defaults=False):
         signature = dict(inspect.signature(self.__init__).parameters.items())
@@ -161,7 +204,7 @@ class Dataset():
             signature = {**dict(inspect.signature(class_object.__init__).parameters.items()), **signature}
             if len(class_object.__bases__) == 0: break
             class_object = class_object.__bases__[0]
-        arg_names = [n for n in signature.keys() if not n in ['self', 'args', 'kwargs', 'n_jobs', 'root', 'verbosity']+self.exlude_args_from_signature]
+        arg_names = [n for n in signature.keys() if not n in ['self', 'args', 'kwargs', 'n_jobs', 'root', 'pdb_parser', 'parse_cache', 'storage', 'verbosity']+self.exlude_args_from_signature]
         if use_defaults:
             return self.name + ' | ' + ', '.join([k + '=' + str(signature[k].default) for k in arg_names])
         return self.name + ' | ' + ', '.join([k + '=' + str(getattr(self, k)) for k in arg_names])
@@ -188,13 +231,21 @@ class Dataset():
         """
         if not self.signature == self.default_signature: error('The dataset arguments do not match the precomputed dataset arguments (the default settings). Set use_precomputed to False if you wish to generate a new dataset.', verbosity=self.verbosity)
 
-    def proteins(self, resolution='residue'):
-        """ Returns a generator of proteins from the avro file.
+    def proteins(self, resolution='residue', attributes=None, shard=None, num_shards=None):
+        """ Returns a generator of proteins from the avro file, or from the columnar storage if `storage='npy'`.
+
+        With `shard` and `num_shards`, only the proteins of one shard are returned, e.g. for the rank of a data parallel training job. The shards are split along the avro blocks, or along the shards of the column release with `storage='npy'` (see :meth:`shard_bounds`), such that each shard is read and downloaded independently of the others.
 
         Parameters
         ----------
         resolution: str, default 'residue'
             The resolution of the proteins. Can be 'atom' or 'residue'.
+        attributes: list, optional
+            The residue or atom level attributes to return, e.g. `['x', 'y', 'z', 'atom_type']`. All attributes if `None`. With `storage='npy'`, only these attributes are downloaded from a column release.
+        shard: int, optional
+            The index of the shard to return. All proteins if `None`.
+        num_shards: int, optional
+            The number of shards. Required with `shard`.
 
         Returns
         -------
@@ -206,15 +257,284 @@ class Dataset():
 
             >>> from proteinshake.datasets import RCSBDataset
             >>> protein = next(RCSBDataset().proteins())
+            >>> rank_proteins = RCSBDataset().proteins(shard=rank, num_shards=world_size)
+        """
+        start, end = self._shard_range(resolution, shard, num_shards)
+        if self.storage == 'npy':
+            release = self.release_shards(resolution=resolution)
+            shards = None if release is None else [i for i in range(len(release)-1) if release[i] < end and release[i+1] > start]
+            columns = self.columns(resolution=resolution, attributes=attributes, shards=shards)
+            return Generator((self._protein_from_columns(columns, i, attributes) for i in range(start, end)), end - start)
+        path = f'{self.root}/{self.name}.{resolution}.avro'
+        if shard is None:
+            def reader():
+                with open(path, 'rb') as file:
+                    for x in avro_reader(file):
+                        yield select_attributes(x, resolution, attributes)
+        else:
+            index = self.avro_index(resolution=resolution)
+            def reader():
+                if start == end: return
+                for x in read_avro_records(path, index['offsets'][start], index['positions'][start], end - start):
+                    yield select_attributes(x, resolution, attributes)
+        return Generator(reader(), end - start)
+
+    def num_proteins(self, resolution='residue'):
+        """ Returns the number of proteins in the dataset. With `storage='npy'` and a column release, only its manifest is downloaded.
+
+        Parameters
+        ----------
+        resolution: str, default 'residue'
+            The resolution of the proteins. Can be 'atom' or 'residue'.
+
+        Returns
+        -------
+        int
+            The number of proteins.
         """
+        if self.storage == 'npy':
+            release = self.release_shards(resolution=resolution)
+            return release[-1] if not release is None else len(self.columns(resolution=resolution)['proteins'])
         self.download_precomputed(resolution=resolution)
         with open(f'{self.root}/{self.name}.{resolution}.avro', 'rb') as file:
-            total = int(avro_reader(file).metadata['number_of_proteins'])
-        def reader():
-            with open(f'{self.root}/{self.name}.{resolution}.avro', 'rb') as file:
-                for x in avro_reader(file):
-                    yield x
-        return Generator(reader(), total)
+            return int(avro_reader(file).metadata['number_of_proteins'])
+
+    def release_shards(self, resolution='residue'):
+        """ Returns the shard bounds of the column release of the precomputed dataset (see :meth:`proteinshake.utils.write_column_release`), fetching only its manifest. Only relevant with `storage='npy'`.
+
+        Parameters
+        ----------
+        resolution: str, default 'residue'
+            The resolution of the proteins. Can be 'atom' or 'residue'.
+
+        Returns
+        -------
+        list
+            The protein index at which each shard starts, followed by the number of proteins, or `None` if no column release is used.
+        """
+        if self.storage != 'npy':
+            return None
+        self.fetch_columns(resolution=resolution, attributes=[], shards=[])
+        path = f'{self.root}/{self.name}.{resolution}.columns/columns.json'
+        return load(path).get('shards') if os.path.exists(path) else None
+
+    def shard_bounds(self, num_shards, resolution='residue'):
+        """ Splits the dataset into `num_shards` contiguous shards of approximately equal size. The bounds are aligned to the blocks of the storage, i.e. the avro blocks, or the shards of the column release with `storage='npy'`, such that no block has to be read by more than one shard. Shards may therefore differ in size by up to one block, and may be empty if there are fewer blocks than shards.
+
+        Parameters
+        ----------
+        num_shards: int
+            The number of shards.
+        resolution: str, default 'residue'
+            The resolution of the proteins. Can be 'atom' or 'residue'.
+
+        Returns
+        -------
+        list
+            The `num_shards+1` protein indices that delimit the shards. Shard `i` holds the proteins `bounds[i]` to `bounds[i+1]-1`.
+        """
+        if num_shards < 1: error('The number of shards must be positive.', verbosity=self.verbosity)
+        total = self.num_proteins(resolution=resolution)
+        if num_shards == 1 or total == 0:
+            return [0] * num_shards + [total]
+        starts = self.release_shards(resolution=resolution)
+        if starts is None and self.storage == 'npy':
+            starts = np.arange(total+1) # every protein can be sliced separately
+        elif starts is None:
+            offsets = self.avro_index(resolution=resolution)['offsets']
+            starts = [i for i in range(total) if i == 0 or offsets[i] != offsets[i-1]] + [total]
+        starts = np.asarray(starts)
+        targets = total * np.arange(num_shards+1) / num_shards
+        right = np.clip(np.searchsorted(starts, targets), 1, len(starts)-1)
+        left = right - 1
+        nearest = np.where(targets - starts[left] <= starts[right] - targets, left, right)
+        return [int(i) for i in starts[nearest]]
+
+    def _shard_range(self, resolution, shard, num_shards):
+        if shard is None and num_shards is None:
+            return 0, self.num_proteins(resolution=resolution)
+        if shard is None or num_shards is None: error('Both shard and num_shards have to be given.', verbosity=self.verbosity)
+        if not 0 <= shard < num_shards: error(f'The shard index {shard} is out of range for {num_shards} shards.', verbosity=self.verbosity)
+        bounds = self.shard_bounds(num_shards, resolution=resolution)
+        return bounds[shard], bounds[shard+1]
+
+    def avro_index(self, resolution='residue'):
+        """ Returns the offset index of the avro file, which maps each protein to the avro block it is stored in. The index is built on first access if it does not exist yet and cached afterwards.
+
+        Parameters
+        ----------
+        resolution: str, default 'residue'
+            The resolution of the proteins. Can be 'atom' or 'residue'.
+
+        Returns
+        -------
+        dict
+            The index with keys `offsets`, `positions`, and `ids`, and an additional `lookup` dictionary from ID to protein index.
+        """
+        if not resolution in self._avro_index:
+            self.download_precomputed(resolution=resolution)
+            index = load_avro_index(f'{self.root}/{self.name}.{resolution}.avro')
+            index['lookup'] = {id: i for i, id in enumerate(index['ids'])}
+            self._avro_index[resolution] = index
+        return self._avro_index[resolution]
+
+    def columns(self, resolution='residue', attributes=None, shards=None):
+        """ Returns the memory-mapped columnar storage of the dataset (see :meth:`proteinshake.utils.write_columns`). The storage is fetched from the column release of the precomputed dataset if available (see :meth:`fetch_columns`), or converted from the avro file on first access.
+
+        Parameters
+        ----------
+        resolution: str, default 'residue'
+            The resolution of the proteins. Can be 'atom' or 'residue'.
+        attributes: list, optional
+            The residue or atom level attributes that are needed. All attributes if `None`.
+        shards: list, optional
+            The shards of the column release that are needed. All shards if `None`.
+
+        Returns
+        -------
+        dict
+            The columnar storage with keys `level`, `proteins`, `offsets`, `columns`, and `fetched`, and an additional `lookup` dictionary from ID to protein index.
+        """
+        if self.fetch_columns(resolution=resolution, attributes=attributes, shards=shards):
+            self._columns.pop(resolution, None)
+        if not resolution in self._columns:
+            path = f'{self.root}/{self.name}.{resolution}.columns'
+            avro_path = f'{self.root}/{self.name}.{resolution}.avro'
+            # a partially fetched storage is replaced if the full dataset is available locally
+            if not os.path.exists(f'{path}/columns.json') or ('fetched' in load(f'{path}/columns.json') and os.path.exists(avro_path)):
+                self.download_precomputed(resolution=resolution)
+                if self.verbosity > 0: print('Converting to columnar storage...')
+                write_columns(avro_path, path)
+            columns = load_columns(path)
+            columns['lookup'] = {p['ID']: i for i, p in enumerate(columns['proteins'])}
+            self._columns[resolution] = columns
+        return self._columns[resolution]
+
+    def fetch_columns(self, resolution='residue', attributes=None, shards=None):
+        """ Downloads the requested attributes of the precomputed dataset from its column release (see :meth:`proteinshake.utils.write_column_release`) into the columnar storage, instead of downloading the whole avro file. Only missing attributes and shards are fetched, in parallel. The arrays of the storage are allocated as sparse files and filled shard by shard.
+
+        Parameters
+        ----------
+        resolution: str, default 'residue'
+            The resolution of the proteins. Can be 'atom' or 'residue'.
+        attributes: list, optional
+            The residue or atom level attributes to fetch. All attributes if `None`.
+        shards: list, optional
+            The shards to fetch. All shards if `None`.
+
+        Returns
+        -------
+        bool
+            Whether any attributes were fetched. `False` if the dataset is not precomputed, the avro file was already downloaded, or no column release is available.
+        """
+        if resolution in self._columns and self._columns[resolution]['fetched'] is None:
+            return False
+        path = f'{self.root}/{self.name}.{resolution}.columns'
+        if not self.use_precomputed or os.path.exists(f'{self.root}/{self.name}.{resolution}.avro'):
+            return False
+        url = f'{self.repository_url}/{self.name}.{resolution}.columns'
+        if os.path.exists(f'{path}/columns.json'):
+            meta = load(f'{path}/columns.json')
+            if not 'fetched' in meta:
+                return False
+        else:
+            try:
+                with BulkDownloader(max_concurrency=1, cache=get_http_cache()) as downloader:
+                    manifest = downloader.get(f'{url}.json').json()
+            except (requests.ConnectionError, requests.HTTPError):
+                return False
+            os.makedirs(path, exist_ok=True)
+            for file_name in ['offsets.npy', 'protein.json']:
+                download_url(f'{url}.{file_name}.gz', f'{path}/{file_name}.gz', verbosity=0, decompress=True)
+            meta = {'level': manifest['level'], 'columns': [], 'dtypes': manifest['columns'], 'shards': manifest['shards'], 'fetched': {}}
+            save(meta, f'{path}/columns.json')
+        attributes = list(meta['dtypes']) if attributes is None else attributes
+        unknown = [attribute for attribute in attributes if not attribute in meta['dtypes']]
+        if len(unknown) > 0: error(f'Unknown attributes {", ".join(unknown)}. Use any of {", ".join(meta["dtypes"])}.', verbosity=self.verbosity)
+        shards = range(len(meta['shards']) - 1) if shards is None else shards
+        missing = [(attribute, i) for attribute in attributes for i in shards if not i in meta['fetched'].get(attribute, [])]
+        if len(missing) == 0:
+            return False
+        offsets = np.load(f'{path}/offsets.npy')
+        arrays = {}
+        for attribute in dict.fromkeys(attribute for attribute, _ in missing):
+            array_path = f'{path}/{attribute}.npy'
+            arrays[attribute] = np.lib.format.open_memmap(array_path, mode='r+' if os.path.exists(array_path) else 'w+', dtype=meta['dtypes'][attribute], shape=(int(offsets[-1]),))
+        def fetch(item):
+            attribute, i = item
+            download_url(f'{url}.{attribute}.{i}.npy.gz', f'{path}/{attribute}.{i}.npy.gz', verbosity=0, decompress=True)
+            start, end = offsets[meta['shards'][i]], offsets[meta['shards'][i+1]]
+            arrays[attribute][start:end] = np.load(f'{path}/{attribute}.{i}.npy')
+            os.remove(f'{path}/{attribute}.{i}.npy')
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(progressbar(executor.map(fetch, missing), desc='Fetching columns', total=len(missing), verbosity=self.verbosity))
+        for array in arrays.values():
+            array.flush()
+        for attribute, i in missing:
+            meta['fetched'].setdefault(attribute, []).append(i)
+        meta['columns'] = list(meta['fetched'])
+        if all(len(meta['fetched'].get(attribute, [])) == len(meta['shards']) - 1 for attribute in meta['dtypes']):
+            del meta['fetched'] # complete
+        save(meta, f'{path}/columns.json')
+        return True
+
+    def _protein_from_columns(self, columns, idx, attributes=None):
+        start, end = columns['offsets'][idx], columns['offsets'][idx+1]
+        return {
+            'protein': dict(columns['proteins'][idx]),
+            columns['level']: {name: column[start:end] for name, column in columns['columns'].items() if attributes is None or name in attributes},
+        }
+
+    def get(self, idx, resolution='residue', attributes=None):
+        """ Returns a single protein by its position in the dataset. Seeks directly to the avro block holding the protein instead of decoding the whole file, or slices the memory-mapped arrays if `storage='npy'`.
+
+        Parameters
+        ----------
+        idx: int
+            The index of the protein, in the order of :meth:`proteins`.
+        resolution: str, default 'residue'
+            The resolution of the proteins. Can be 'atom' or 'residue'.
+        attributes: list, optional
+            The residue or atom level attributes to return. See :meth:`proteins`.
+
+        Returns
+        -------
+        dict
+            A protein object.
+
+
+        .. code-block:: python
+
+            >>> from proteinshake.datasets import RCSBDataset
+            >>> protein = RCSBDataset().get(42)
+        """
+        if self.storage == 'npy':
+            columns = self.columns(resolution=resolution, attributes=attributes)
+            return self._protein_from_columns(columns, range(len(columns['proteins']))[idx], attributes)
+        index = self.avro_index(resolution=resolution)
+        return select_attributes(read_avro_record(f'{self.root}/{self.name}.{resolution}.avro', index['offsets'][idx], index['positions'][idx]), resolution, attributes)
+
+    def get_by_id(self, ID, resolution='residue', attributes=None):
+        """ Returns a single protein by its identifier. See :meth:`get`.
+
+        Parameters
+        ----------
+        ID: str
+            The identifier of the protein, as stored in `protein['protein']['ID']`.
+        resolution: str, default 'residue'
+            The resolution of the proteins. Can be 'atom' or 'residue'.
+        attributes: list, optional
+            The residue or atom level attributes to return. See :meth:`proteins`.
+
+        Returns
+        -------
+        dict
+            A protein object.
+        """
+        index = self.columns(resolution=resolution, attributes=attributes) if self.storage == 'npy' else self.avro_index(resolution=resolution)
+        if not ID in index['lookup']:
+            raise KeyError(f'{ID} is not in {self.name}.')
+        return self.get(index['lookup'][ID], resolution=resolution, attributes=attributes)
 
     @property
     def limit(self):
@@ -234,7 +554,7 @@ class Dataset():
     def get_raw_files(self):
         """ Implement me in a subclass!
 
-        Returns a list of all valid PDB file paths for this dataset. Usually takes the form `glob.glob(f'{self.root}/raw/files/*.pdb')` to search for all pdb files in the root, but can be different in some cases (e.g. with pdb.gz files).
+        Returns a list of all valid PDB file paths for this dataset. Usually takes the form `glob.glob(f'{self.root}/raw/files/*.pdb')` to search for all pdb files in the root, but can be different in some cases. Files in mmCIF (`.cif`) or BinaryCIF (`.bcif`) format are parsed according to their extension. Paths may point to gzip-compressed files (e.g. `.pdb.gz`) or to members of a tar archive (see :meth:`proteinshake.utils.list_tar`), which are read without extracting them to disk.
 
         Returns
         -------
@@ -243,6 +563,16 @@ class Dataset():
         """
         raise NotImplementedError
 
+    def iter_raw_files(self):
+        """ Returns the raw files to be parsed as `(path, data)` tuples, where `data` holds the raw file contents if they were already read, and `None` otherwise. By default, these are the first `limit` paths of :meth:`get_raw_files` without data. Subclasses can override it with a generator to stream files from an archive sequentially (see :meth:`proteinshake.datasets.AlphaFoldDataset.iter_raw_files`), in which case the files are parsed while the archive is still being read.
+
+        Returns
+        -------
+        iterable
+            The `(path, data)` tuples.
+        """
+        return [(path, None) for path in self.get_raw_files()[:self.limit]]
+
     def get_id_from_filename(self, filename):
         """ Implement me in a subclass!
 
@@ -300,82 +630,181 @@ class Dataset():
         self.download_complete()
 
     def download_precomputed(self, resolution='residue'):
-        """ Downloads the precomputed dataset from the ProteinShake repository.
+        """ Downloads the precomputed dataset from the ProteinShake repository. The file is decompressed while it is downloaded.
         """
         if not os.path.exists(f'{self.root}/{self.name}.{resolution}.avro'):
-            download_url(f'{self.repository_url}/{self.name}.{resolution}.avro.gz', f'{self.root}', verbosity=self.verbosity)
-            if self.verbosity > 0: print('Unzipping...')
-            unzip_file(f'{self.root}/{self.name}.{resolution}.avro.gz')
+            download_url(f'{self.repository_url}/{self.name}.{resolution}.avro.gz', f'{self.root}', verbosity=self.verbosity, decompress=True)
 
     def parse(self):
-        """ Parses all PDB files returned from :meth:`proteinshake.datasets.Dataset.get_raw_files()` and saves them to disk. Can run in parallel.
+        """ Parses all PDB files returned from :meth:`proteinshake.datasets.Dataset.iter_raw_files()` and saves them to disk. Runs in parallel with `n_jobs > 1`, see :meth:`parse_chunks`.
+        With `parse_cache=True`, previously parsed files are loaded from the cache, so that deleting the avro files and parsing again only processes new or changed files.
         """
         if os.path.exists(f'{self.root}/{self.name}.residue.avro'):
             return
-        # parse and filter
-        paths = self.get_raw_files()[:self.limit]
-        proteins = Parallel(n_jobs=self.n_jobs)(delayed(self.parse_pdb)(path) for path in progressbar(paths, desc='Parsing', verbosity=self.verbosity))
-        before = len(proteins)
-        proteins = [p for p in proteins if p is not None]
-
-        if self.verbosity > 0: print(f'Filtered {before-len(proteins)} proteins.')
-
-        # if self.center:
-        # if True:
-        # if self.random_rotate:
-        if self.name == 'ProteinProteinInteractionDataset':
-            print("Centering")
-            proteins = [CenterTransform()(p) for p in proteins]
-            print("Rotating")
-            seeds = (abs(hash(p['protein']['sequence'])) % 2**28 for p in proteins)
-            proteins = [RandomRotateTransform(seed=seed)(p) for seed, p in zip(seeds, proteins)]
-
-        residue_proteins = [{'protein':p['protein'], 'residue':p['residue']} for p in proteins]
-        atom_proteins = [{'protein':p['protein'], 'atom':p['atom']} for p in proteins]
-        write_avro(residue_proteins, f'{self.root}/{self.name}.residue.avro')
-        write_avro(atom_proteins, f'{self.root}/{self.name}.atom.avro')
-
-    def parse_pdb(self, path):
-        """ Parses a single PDB file first into a DataFrame, then into a protein object (a dictionary). Also validates the PDB file and provides the hook for `add_protein_attributes`. Returns `None` if the protein was found to be invalid.
+        # parse and filter, streaming the results from the workers directly into the avro files
+        items = self.iter_raw_files()
+        total = len(items) if hasattr(items, '__len__') else None
+        if self.parse_cache:
+            os.makedirs(f'{self.root}/parse_cache', exist_ok=True)
+            self.signature # compute the cached signature once, before the dataset is sent to the workers
+        proteins = self.parse_chunks(items)
+        filtered = 0
+        self.parse_timings = Counter()
+        with AvroWriter(f'{self.root}/{self.name}.residue.avro') as residue_writer, AvroWriter(f'{self.root}/{self.name}.atom.avro') as atom_writer:
+            for protein, timings in progressbar(proteins, desc='Parsing', total=total, verbosity=self.verbosity):
+                self.parse_timings.update(timings)
+                if protein is None:
+                    filtered += 1
+                    continue
+                # if self.center:
+                # if True:
+                # if self.random_rotate:
+                if self.name == 'ProteinProteinInteractionDataset':
+                    protein = CenterTransform()(protein)
+                    seed = abs(hash(protein['protein']['sequence'])) % 2**28
+                    protein = RandomRotateTransform(seed=seed)(protein)
+                residue_writer.write({'protein':protein['protein'], 'residue':protein['residue']})
+                atom_writer.write({'protein':protein['protein'], 'atom':protein['atom']})
+
+        if self.verbosity > 0: print(f'Filtered {filtered} proteins.')
+        if self.verbosity > 0 and len(self.parse_timings) > 0: print('Parse time per stage: ' + ', '.join(f'{stage} {seconds:.1f}s' for stage, seconds in self.parse_timings.items()))
+
+    def parse_chunks(self, items):
+        """ Parses PDB files on `n_jobs` worker processes. Each worker receives the dataset once on start-up and then parses chunks of `parse_chunk_size` files, returning the proteins of a chunk packed into shared memory (see :meth:`proteinshake.utils.share_proteins`) instead of pickling them.
+        The items are consumed lazily with at most `2 * n_jobs` chunks in flight, such that a generator streaming files from an archive is never read far ahead of the workers. If parsing is aborted (an error, or the generator is closed), the chunks in flight are drained and their shared memory blocks are freed before the pool is terminated.
+
+        Parameters
+        ----------
+        items: iterable
+            `(path, data)` tuples, see :meth:`iter_raw_files`.
+
+        Returns
+        -------
+        generator
+            The protein objects (or `None`) and stage timings of :meth:`parse_pdb_timed`, in the order of `items`.
+        """
+        n_jobs = effective_n_jobs(self.n_jobs)
+        if hasattr(items, '__len__'):
+            n_jobs = min(n_jobs, max(len(items), 1))
+        if n_jobs == 1:
+            for path, data in items:
+                yield self.parse_pdb_timed(path, data=data)
+            return
+        chunk_size = self.parse_chunk_size
+        if hasattr(items, '__len__'):
+            chunk_size = max(1, min(chunk_size, len(items) // (4 * n_jobs))) # small enough to balance the load across workers
+        items = iter(items)
+        chunks = iter(lambda: list(itertools.islice(items, chunk_size)), [])
+        with mp.Pool(n_jobs, initializer=init_parse_worker, initargs=(self,)) as pool:
+            pending = deque()
+            try:
+                pending.extend(pool.apply_async(parse_chunk, (chunk,)) for chunk in itertools.islice(chunks, 2 * n_jobs))
+                while len(pending) > 0:
+                    shared, timings = pending.popleft().get()
+                    for chunk in itertools.islice(chunks, 1):
+                        pending.append(pool.apply_async(parse_chunk, (chunk,)))
+                    yield from zip(load_shared_proteins(shared), timings)
+            finally:
+                # the blocks are not tracked by the workers, free those that are not loaded
+                for result in pending:
+                    try:
+                        shared, _ = result.get()
+                    except Exception:
+                        continue
+                    free_shared_proteins(shared)
+
+    def parse_cache_path(self, path):
+        """ Returns the path of the parse cache entry of a PDB file. The entry is keyed on the file path, modification time, size, and the dataset signature, such that changed files or dataset arguments invalidate the cache. For members of a tar archive, the modification time and size of the archive are used.
+
         Parameters
         ----------
         path: str
             Path to PDB file.
+
+        Returns
+        -------
+        str
+            Path to the cache entry.
+        """
+        archive = path
+        while not os.path.isfile(archive) and not os.path.dirname(archive) in ['', archive]:
+            archive = os.path.dirname(archive)
+        stat = os.stat(archive)
+        key = f'{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{self.signature}'
+        return f'{self.root}/parse_cache/{hashlib.md5(key.encode("utf-8")).hexdigest()}.pkl'
+
+    def parse_pdb_cached(self, path, timings=None, data=None):
+        """ Same as :meth:`parse_pdb`, but loads the protein object from the parse cache if available and stores it otherwise. Filtered proteins (`None`) are cached as well.
+
+        Parameters
+        ----------
+        path: str
+            Path to PDB file.
+        timings: dict, optional
+            Passed on to :meth:`parse_pdb`.
+        data: bytes, optional
+            Passed on to :meth:`parse_pdb`.
+
         Returns
         -------
         dict
             A protein object.
         """
+        cache_path = self.parse_cache_path(path)
+        if os.path.exists(cache_path):
+            return load(cache_path)
+        protein = self.parse_pdb(path, timings=timings, data=data)
+        save(protein, cache_path+'.tmp')
+        os.replace(cache_path+'.tmp', cache_path) # an interrupted parse must not leave a broken cache entry
+        return protein
+
+    def parse_pdb_timed(self, path, data=None):
+        """ Same as :meth:`parse_pdb` (or :meth:`parse_pdb_cached` with `parse_cache=True`), but also returns the time spent in each parse stage.
+
+        Parameters
+        ----------
+        path: str
+            Path to PDB file.
+        data: bytes, optional
+            Passed on to :meth:`parse_pdb`.
+
+        Returns
+        -------
+        tuple
+            The protein object and a dictionary of stage names to seconds.
+        """
+        timings = {}
+        parse_pdb = self.parse_pdb_cached if self.parse_cache else self.parse_pdb
+        return parse_pdb(path, timings=timings, data=data), timings
+
+    def parse_pdb(self, path, timings=None, data=None):
+        """ Parses a single PDB file first into a DataFrame, then into a protein object (a dictionary). Also validates the PDB file. The protein object is then filled by the feature stages in `parse_stages` (see :meth:`stage_coordinates` and following), the last of which provides the hook for `add_protein_attributes`. Returns `None` if the protein was found to be invalid.
+
+        Parameters
+        ----------
+        path: str
+            Path to PDB file.
+        timings: dict, optional
+            If given, the seconds spent reading the file (`'pdb2df'`) and in each stage are added to it.
+        data: bytes, optional
+            The raw file contents, if already read. See :meth:`pdb2df`.
+
+        Returns
+        -------
+        dict
+            A protein object.
+        """
+        timings = {} if timings is None else timings
         pdbid = self.get_id_from_filename(os.path.basename(path))
         if pdbid in self.exclude_ids:
             return None
-        atom_df = self.pdb2df(path)
+        start = time.perf_counter()
+        atom_df = self.pdb2df(path, data=data)
         residue_df = atom_df[atom_df['atom_type'] == 'CA']
+        timings['pdb2df'] = timings.get('pdb2df', 0) + time.perf_counter() - start
         if not self.validate(atom_df):
             return None
 
-        # add surface accessible area
-        structure = freesasa.Structure(path)
-        result = freesasa.calc(structure)
-        residue_result = result.residueAreas()
-        atom_sasa, residue_sasa, residue_rsa = [], [], []
-        for i in atom_df['atom_number']:
-            try:
-                assert not np.isnan(result.atomArea(i)), "nan sasa"
-                atom_sasa.append(result.atomArea(i))
-            except:
-                atom_sasa.append(-1)
-        for i,chain in zip(residue_df['residue_number'], residue_df['chain_id']):
-            try:
-                assert not np.isnan(residue_result[chain][str(i)].total), "nan sasa"
-                assert not np.isnan(residue_result[chain][str(i)].relativeTotal), "nan sasa"
-
-                residue_sasa.append(residue_result[chain][str(i)].total)
-                residue_rsa.append(residue_result[chain][str(i)].relativeTotal)
-            except:
-                residue_sasa.append(-1)
-                residue_rsa.append(-1)
-
         # create protein_dict
         protein = {
             'protein': {
@@ -385,67 +814,202 @@ class Dataset():
             'residue': {
                 'residue_number': residue_df['residue_number'].tolist(),
                 'residue_type': residue_df['residue_type'].tolist(),
-                'x': residue_df['x'].tolist(),
-                'y': residue_df['y'].tolist(),
-                'z': residue_df['z'].tolist(),
-                'SASA': residue_sasa,
-                'RSA': residue_rsa,
             },
             'atom': {
                 'atom_number': atom_df['atom_number'].tolist(),
                 'atom_type': atom_df['atom_type'].tolist(),
                 'residue_number': atom_df['residue_number'].tolist(),
                 'residue_type': atom_df['residue_type'].tolist(),
-                'x': atom_df['x'].tolist(),
-                'y': atom_df['y'].tolist(),
-                'z': atom_df['z'].tolist(),
-                'SASA': atom_sasa,
             },
         }
 
         # only include chains if multi-chain protein
-        if not self.only_single_chain: 
+        if not self.only_single_chain:
             protein['residue']['chain_id'] = residue_df['chain_id'].tolist()
             protein['atom']['chain_id'] = atom_df['chain_id'].tolist()
 
-        # add pLDDT from AlphaFold
-        if self.name == 'AlphaFoldDataset':
-            protein['residue']['pLDDT'] = residue_df['b_factor'].tolist()
-            protein['atom']['pLDDT'] = atom_df['b_factor'].tolist()
+        # add features
+        for stage in self.parse_stages:
+            if stage in self.exclude_stages:
+                continue
+            start = time.perf_counter()
+            protein = getattr(self, f'stage_{stage}')(protein, atom_df, residue_df)
+            timings[stage] = timings.get(stage, 0) + time.perf_counter() - start
+
+        return protein
+
+    def stage_coordinates(self, protein, atom_df, residue_df):
+        """ Parse stage that adds the 3D coordinates of residues (CA atoms) and atoms.
+
+        Parameters
+        ----------
+        protein: dict
+            The protein object.
+        atom_df: DataFrame
+            The atom DataFrame returned by :meth:`pdb2df`.
+        residue_df: DataFrame
+            The residue (CA atom) subset of `atom_df`.
 
-        # add attributes
-        protein = self.add_protein_attributes(protein)
+        Returns
+        -------
+        dict
+            The protein object.
+        """
+        for level, df in [('residue', residue_df), ('atom', atom_df)]:
+            protein[level]['x'] = df['x'].tolist()
+            protein[level]['y'] = df['y'].tolist()
+            protein[level]['z'] = df['z'].tolist()
+        return protein
+
+    def stage_sasa(self, protein, atom_df, residue_df):
+        """ Parse stage that adds the solvent accessible surface area (`SASA`) of residues and atoms, and the relative accessible surface area (`RSA`) of residues. See :meth:`compute_sasa`.
+
+        Parameters
+        ----------
+        protein: dict
+            The protein object.
+        atom_df: DataFrame
+            The atom DataFrame returned by :meth:`pdb2df`.
+        residue_df: DataFrame
+            The residue (CA atom) subset of `atom_df`.
+
+        Returns
+        -------
+        dict
+            The protein object.
+        """
+        atom_sasa, residue_sasa, residue_rsa = self.compute_sasa(atom_df, residue_df)
+        protein['residue']['SASA'] = residue_sasa
+        protein['residue']['RSA'] = residue_rsa
+        protein['atom']['SASA'] = atom_sasa
+        return protein
+
+    def stage_plddt(self, protein, atom_df, residue_df):
+        """ Parse stage that adds the AlphaFold confidence (`pLDDT`), which is stored in the B-factor column of AlphaFold structures. Only included in the `parse_stages` of AlphaFold datasets.
+
+        Parameters
+        ----------
+        protein: dict
+            The protein object.
+        atom_df: DataFrame
+            The atom DataFrame returned by :meth:`pdb2df`.
+        residue_df: DataFrame
+            The residue (CA atom) subset of `atom_df`.
 
+        Returns
+        -------
+        dict
+            The protein object.
+        """
+        protein['residue']['pLDDT'] = residue_df['b_factor'].tolist()
+        protein['atom']['pLDDT'] = atom_df['b_factor'].tolist()
         return protein
 
-    def pdb2df(self, path):
-        """ Parses a single PDB file to a DataFrame (with biopandas). Also deals with multiple structure models in a PDB (e.g. from NMR) by only selecting the first model.
+    def stage_protein_attributes(self, protein, atom_df, residue_df):
+        """ Parse stage that calls the dataset-specific :meth:`add_protein_attributes`.
+
+        Parameters
+        ----------
+        protein: dict
+            The protein object.
+        atom_df: DataFrame
+            The atom DataFrame returned by :meth:`pdb2df`.
+        residue_df: DataFrame
+            The residue (CA atom) subset of `atom_df`.
+
+        Returns
+        -------
+        dict
+            The protein object.
+        """
+        return self.add_protein_attributes(protein)
+
+    def compute_sasa(self, atom_df, residue_df):
+        """ Computes the solvent accessible surface area of a protein with freesasa. The freesasa structure is built from the already parsed atoms rather than re-reading the file, using the same atom selection as freesasa (no hydrogens and only the first alternate location). Atoms and residues without a value get -1.
+
+        Parameters
+        ----------
+        atom_df: DataFrame
+            The atom DataFrame returned by :meth:`pdb2df`.
+        residue_df: DataFrame
+            The residue (CA atom) subset of `atom_df`.
+
+        Returns
+        -------
+        tuple
+            The atom SASA, residue SASA and residue RSA as lists.
+        """
+        alt_locs = atom_df['alt_loc'][atom_df['alt_loc'] != '']
+        first_alt_loc = alt_locs.iloc[0] if len(alt_locs) > 0 else ''
+        hydrogen = atom_df['element_symbol'].isin(['H', 'D']) | ((atom_df['element_symbol'] == '') & atom_df['atom_type'].str.match('[HD]'))
+        selected = ~hydrogen & atom_df['alt_loc'].isin(['', first_alt_loc])
+        atoms = atom_df[selected]
+        # residues are keyed by chain, number and insertion code, such that multi-letter chain ids of mmCIF files fit into a single freesasa chain
+        residue_key = lambda df: df['chain_id'] + '/' + df['residue_number'].astype(str) + df['insertion']
+        # freesasa guesses the element from the position of the atom name in the PDB columns 13-16, where one-letter elements are in column 14
+        atom_names = [name if len(name) == 4 else ' ' + name.ljust(3) for name in atoms['atom_type']]
+        structure = freesasa.Structure()
+        structure.addAtoms(
+            atom_names,
+            atoms['residue_type'].map(AA_ONE_TO_THREE).tolist(),
+            residue_key(atoms).tolist(),
+            ['A'] * len(atoms),
+            atoms['x'].tolist(), atoms['y'].tolist(), atoms['z'].tolist(),
+        )
+        result = freesasa.calc(structure)
+        areas = np.fromiter(map(result.atomArea, range(structure.nAtoms())), dtype=float, count=structure.nAtoms())
+        if structure.nAtoms() != len(atoms): # the classifier skipped some atoms, match the remaining ones by residue and name
+            added = pd.MultiIndex.from_arrays([[structure.residueNumber(i) for i in range(structure.nAtoms())], [structure.atomName(i).strip() for i in range(structure.nAtoms())]])
+            areas = pd.Series(areas, index=added).reindex(pd.MultiIndex.from_arrays([residue_key(atoms), atoms['atom_type']])).to_numpy()
+        atom_sasa = np.full(len(atom_df), np.nan)
+        atom_sasa[selected.to_numpy()] = areas
+        residue_areas = result.residueAreas().get('A', {})
+        residue_areas = pd.DataFrame(
+            [(area.total, area.relativeTotal) for area in residue_areas.values()],
+            index=list(residue_areas.keys()), columns=['SASA', 'RSA'], dtype=float,
+        ).reindex(residue_key(residue_df))
+        return (
+            np.nan_to_num(atom_sasa, nan=-1).tolist(),
+            residue_areas['SASA'].fillna(-1).tolist(),
+            residue_areas['RSA'].fillna(-1).tolist(),
+        )
+
+    def pdb2df(self, path, data=None):
+        """ Parses a single PDB file to a DataFrame (with biopandas, or the native parser if `pdb_parser='native'`). mmCIF (`.cif`) and BinaryCIF (`.bcif`) files are read with their own parsers into the same columns. Also deals with multiple structure models in a PDB (e.g. from NMR) by only selecting the first model.
 
         Parameters
         ----------
         path: str
-            Path to PDB file.
+            Path to PDB, mmCIF or BinaryCIF file. Can be gzip-compressed or a member of a tar archive.
+        data: bytes, optional
+            The raw file contents, if they were already read (e.g. while streaming an archive). The path then only determines the format.
 
         Returns
         -------
         DataFrame
             A biopandas DataFrame of the PDB file.
         """
-        with open(path, 'r') as file:
-            lines = file.read().split('\n')
-        # filter only the first model
-        filtered_lines, in_model, model_done = [], False, False
-        for line in lines:
-            if line.startswith('MODEL'):
-                in_model = True
-            if in_model and model_done:
-                continue
-            if line.startswith('ENDMDL'):
-                model_done = True
-                in_model = False
-            filtered_lines.append(line)
+        if path.endswith(('.cif', '.cif.gz')):
+            df = read_cif_atoms(path, data)
+        elif path.endswith(('.bcif', '.bcif.gz')):
+            df = read_bcif_atoms(path, data)
+        elif self.pdb_parser == 'native':
+            df = read_pdb_atoms(path, data)
+        else:
+            lines = read_raw_file(path, data).decode('utf-8').replace('\r\n', '\n').split('\n')
+            # filter only the first model
+            filtered_lines, in_model, model_done = [], False, False
+            for line in lines:
+                if line.startswith('MODEL'):
+                    in_model = True
+                if in_model and model_done:
+                    continue
+                if line.startswith('ENDMDL'):
+                    model_done = True
+                    in_model = False
+                filtered_lines.append(line)
+            df = PandasPdb().read_pdb_from_list(filtered_lines).df['ATOM']
         IONS = ['ZN', 'MG']
-        df = PandasPdb().read_pdb_from_list(filtered_lines).df['ATOM']
         df = df.loc[~df['residue_name'].isin(IONS)]
         df['residue_name'] = df['residue_name'].map(lambda x: AA_THREE_TO_ONE[x] if x in AA_THREE_TO_ONE else None)
         #df['atom_name'] = df['atom_name'].map(lambda x: x[0]) # each atom is a multi-letter code where the first letter indicates the atom type
@@ -505,6 +1069,15 @@ class Dataset():
                }
         return data
     
+    def _transformed_proteins(self, resolution, transform, shard=None, num_shards=None):
+        # lazy, such that a sharded representation only reads its own shard
+        start, end = self._shard_range(resolution, shard, num_shards)
+        def reader():
+            for protein in self.proteins(resolution=resolution, shard=shard, num_shards=num_shards):
+                yield transform(protein)
+        shard_fn = (lambda i, n: self._transformed_proteins(resolution, transform, i, n)) if shard is None else None
+        return Generator(reader(), end - start, shard=shard_fn)
+
     def to_graph(self, resolution='residue', transform=IdentityTransform(), **kwargs):
         """ Converts the raw dataset to a graph dataset. See :meth:`proteinshake.representations.GraphDataset` for arguments.
 
@@ -514,8 +1087,7 @@ class Dataset():
             The dataset in graph representation.
         """
         from proteinshake.representations import GraphDataset
-        proteins = self.proteins(resolution=resolution)
-        return GraphDataset(Generator((transform(p) for p in proteins), len(proteins)),
+        return GraphDataset(self._transformed_proteins(resolution, transform),
                             self.root,
                             self.name,
                             resolution,
@@ -531,8 +1103,7 @@ class Dataset():
             The dataset in point cloud representation.
         """
         from proteinshake.representations import PointDataset
-        proteins = self.proteins(resolution=resolution)
-        return PointDataset(Generator((transform(p) for p in proteins), len(proteins)),
+        return PointDataset(self._transformed_proteins(resolution, transform),
                             self.root,
                             self.name,
                             resolution,
@@ -548,8 +1119,7 @@ class Dataset():
             The dataset in voxel representation.
         """
         from proteinshake.representations import VoxelDataset
-        proteins = self.proteins(resolution=resolution)
-        return VoxelDataset(Generator((transform(p) for p in proteins), len(proteins)),
+        return VoxelDataset(self._transformed_proteins(resolution, transform),
                             self.root,
                             self.name,
                             resolution,
@@ -1,5 +1,3 @@
-import json
-
 from proteinshake.datasets import RCSBDataset
 
 class EnzymeCommissionDataset(RCSBDataset):
@@ -49,7 +47,6 @@ class EnzymeCommissionDataset(RCSBDataset):
     def add_protein_attributes(self, protein):
         """ Fetch the enzyme class for each protein.
         """
-        with open(f'{self.root}/raw/files/{protein["protein"]["ID"]}.annot.json','r') as file:
-            annot = json.load(file)
+        annot = self.get_annotation(protein['protein']['ID'])
         protein['protein']['EC'] = annot['rcsb_polymer_entity']['rcsb_ec_lineage'][-1]['id']
         return protein
@@ -1,8 +1,8 @@
-import json, os
+import os
 from goatools.obo_parser import GODag
 
 from proteinshake.datasets import RCSBDataset
-from proteinshake.utils import download_url, unzip_file
+from proteinshake.utils import download_url
 from functools import cached_property
 
 class GeneOntologyDataset(RCSBDataset):
@@ -62,8 +62,7 @@ class GeneOntologyDataset(RCSBDataset):
     @cached_property
     def godag(self):
         if not os.path.exists(f'{self.root}/{self.name}.godag.obo'):
-            download_url(f'{self.repository_url}/{self.name}.godag.obo.gz', f'{self.root}')
-            unzip_file(f'{self.root}/{self.name}.godag.obo.gz')
+            download_url(f'{self.repository_url}/{self.name}.godag.obo.gz', f'{self.root}', decompress=True)
         return GODag(f'{self.root}/{self.name}.godag.obo', prt=None)
 
     def download(self):
@@ -74,8 +73,7 @@ class GeneOntologyDataset(RCSBDataset):
 
     def add_protein_attributes(self, protein):
         godag = GODag(f'{self.root}/{self.name}.godag.obo', prt=None) # cannot use self.godag because the GODAG is not pickleable (for the release)
-        with open(f'{self.root}/raw/files/{protein["protein"]["ID"]}.annot.json','r') as file:
-            annot = json.load(file)
+        annot = self.get_annotation(protein['protein']['ID'])
         go_terms = []
         if not 'rcsb_polymer_entity_annotation' in annot: return None
         for a in annot['rcsb_polymer_entity_annotation']:
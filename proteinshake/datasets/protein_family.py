@@ -1,5 +1,3 @@
-import json
-
 from proteinshake.datasets import RCSBDataset
 
 class ProteinFamilyDataset(RCSBDataset):
@@ -44,8 +42,7 @@ class ProteinFamilyDataset(RCSBDataset):
         super().__init__(query=query, **kwargs)
 
     def add_protein_attributes(self, protein):
-        with open(f'{self.root}/raw/files/{protein["protein"]["ID"]}.annot.json','r') as file:
-            annot = json.load(file)
+        annot = self.get_annotation(protein['protein']['ID'])
         pfams = []
         for a in annot['rcsb_polymer_entity_annotation']:
             if a['type'] == 'Pfam':
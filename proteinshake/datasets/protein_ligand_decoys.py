@@ -6,7 +6,11 @@ from biopandas.pdb import PandasPdb
 from unittest.mock import patch
 
 from proteinshake.datasets.dataset import Dataset, AA_THREE_TO_ONE
-from proteinshake.utils import download_url, progressbar
+from proteinshake.utils import download_url, save, load, write_string_table, StringTable, BulkDownloader
+
+DUDEZ_URL = 'https://dudez.docking.org'
+
+DUDEZ_TARGETS = ['AA2AR', 'ABL1', 'ACES', 'ADA', 'ADRB2', 'AMPC', 'ANDR', 'CSF1R', 'CXCR4', 'DEF', 'DRD4', 'EGFR', 'FA7', 'FA10', 'FABP4', 'FGFR1', 'FKB1A', 'GLCM', 'HDAC8', 'HIVPR', 'HMDH', 'HS90A', 'ITAL', 'KITH', 'KIT', 'LCK', 'MAPK2', 'MK01', 'MT1', 'NRAM', 'PARP1', 'PLK1', 'PPARA', 'PTN1', 'PUR2', 'RENI', 'ROCK1', 'SRC', 'THRB', 'TRY1', 'TRYB1', 'UROK', 'XIAP']
 
 EXTENDED_AA_THREE_TO_ONE = {
     **AA_THREE_TO_ONE,
@@ -33,6 +37,14 @@ class ProteinLigandDecoysDataset(Dataset):
        :header-rows: 1
        * - # proteins
        * - 38
+   The SMILES strings and identifiers of the molecules are not stored in the proteins, but in two string tables shared by all proteins (see :class:`~proteinshake.utils.StringTable`). Each protein holds the range of its ligands and decoys in these tables. Use :meth:`molecules` to get them.
+
+   .. code-block:: python
+
+      >>> ds = ProteinLigandDecoysDataset()
+      >>> protein = next(ds.proteins())
+      >>> ligands_smiles, ligands_ids = ds.molecules(protein, 'ligands')
+
    .. list-table:: Annotations
       :widths: 25 35 45
       :header-rows: 1
@@ -40,17 +52,23 @@ class ProteinLigandDecoysDataset(Dataset):
         - Key
         - Sample value
       * - Non-binders SIMLES
-        - :code:`protein['protein']['deocys_smiles']`
+        - :code:`ds.molecules(protein, 'decoys')[0]`
         - :code:`['O=C(CSc1nnc(COc2ccccc2)o1)NC1CCCCC1', 'C[N@H+]1CC[C@@](N)(C(=O)NC[C@@H]2CC[C@@H](C[NH3+])CC2)C1',..]`
       * - Non-binders identifiers
-        - :code:`protein['protein']['decoys_ids']`
+        - :code:`ds.molecules(protein, 'decoys')[1]`
         - :code:`['ZINC000000087599', 'ZINC000648138664',..]`
+      * - Non-binders range in the tables
+        - :code:`protein['protein']['decoys_index']`
+        - :code:`[613, 9837]`
       * - Binders SIMLES
-        - :code:`protein['protein']['ligands_smiles']`
+        - :code:`ds.molecules(protein, 'ligands')[0]`
         - :code:`['CC1=CC2=C(NC(=O)[C@H](CC3CC3)C2)C(=O)N1CC(=O)NCC1=CC=C(N)N=C1C', 'ClC1=CC=CC(CC2=NC3=C(NCCC4CCCC[NH2+]4)N=CC=C3O2)=C1',..]`
       * - Binders identifiers 
-        - :code:`protein['protein']['ligands_ids']`
+        - :code:`ds.molecules(protein, 'ligands')[1]`
         - :code:`['CHEMBL10785', 'CHEMBL439678', 'CHEMBL278985',..]`
+      * - Binders range in the tables
+        - :code:`protein['protein']['ligands_index']`
+        - :code:`[0, 613]`
       * - Pfam accession code
         - :code:`protein['protein']['Pfam']`
         - ``['PF00102']``
@@ -58,9 +76,21 @@ class ProteinLigandDecoysDataset(Dataset):
 
     description = 'Proteins with ligands and decoys'
 
+    additional_files = [
+        'ProteinLigandDecoysDataset.molecules.smiles.bin',
+        'ProteinLigandDecoysDataset.molecules.smiles.offsets.npy',
+        'ProteinLigandDecoysDataset.molecules.ids.bin',
+        'ProteinLigandDecoysDataset.molecules.ids.offsets.npy',
+    ]
+
+    def __init__(self, **kwargs):
+        self._molecule_index = None
+        self._molecule_tables = None
+        super().__init__(**kwargs)
+
     @patch('proteinshake.datasets.dataset.AA_THREE_TO_ONE', EXTENDED_AA_THREE_TO_ONE)
-    def pdb2df(self, path):
-        return super().pdb2df(path)
+    def pdb2df(self, path, data=None):
+        return super().pdb2df(path, data=data)
 
     def get_raw_files(self):
         return glob.glob(f'{self.root}/raw/files/*.pdb')[:self.limit]
@@ -69,36 +99,93 @@ class ProteinLigandDecoysDataset(Dataset):
         return filename.split(".")[0]
 
     def download(self):
-        targets  = ['AA2AR', 'ABL1', 'ACES', 'ADA', 'ADRB2', 'AMPC', 'ANDR', 'CSF1R', 'CXCR4', 'DEF', 'DRD4', 'EGFR', 'FA7', 'FA10', 'FABP4', 'FGFR1', 'FKB1A', 'GLCM', 'HDAC8', 'HIVPR', 'HMDH', 'HS90A', 'ITAL', 'KITH', 'KIT', 'LCK', 'MAPK2', 'MK01', 'MT1', 'NRAM', 'PARP1', 'PLK1', 'PPARA', 'PTN1', 'PUR2', 'RENI', 'ROCK1', 'SRC', 'THRB', 'TRY1', 'TRYB1', 'UROK', 'XIAP']
+        """ Downloads the receptor, ligands, and decoys of all targets concurrently with a :class:`~proteinshake.utils.BulkDownloader`, and collects the molecules into string tables (see :meth:`write_molecule_tables`). Files that were already downloaded are skipped.
+        """
+        os.makedirs(f'{self.root}/raw/files', exist_ok=True)
+        files = []
+        for target_id in DUDEZ_TARGETS:
+            files.append((f'{DUDEZ_URL}/DOCKING_GRIDS_AND_POSES/{target_id}/rec.crg.pdb', f'{self.root}/raw/files/{target_id}.pdb'))
+            for mode in ['ligands', 'decoys']:
+                files.append((f'{DUDEZ_URL}/property_matched/{target_id}_new_DUDE_1/{mode}.smi', f'{self.root}/raw/files/{mode}_{target_id}.smi'))
+        files = [(url, path) for url, path in files if not os.path.exists(path)]
+        with BulkDownloader(max_concurrency=8) as downloader:
+            downloader.map(lambda file: downloader.download(*file), files, verbosity=self.verbosity)
+        self.write_molecule_tables()
 
-        for target_id in progressbar(targets, desc='Downloading', verbosity=self.verbosity):
-            # grab receptor
-            download_url(f"https://dudez.docking.org/DOCKING_GRIDS_AND_POSES/{target_id}/rec.crg.pdb", f"{self.root}/raw/files/", verbosity=0)
-            os.rename(f'{self.root}/raw/files/rec.crg.pdb', f'{self.root}/raw/files/{target_id}.pdb')
-            # grab ligands
-            download_url(f"https://dudez.docking.org/property_matched/{target_id}_new_DUDE_1/ligands.smi", f"{self.root}/raw/files/", verbosity=0)
-            os.rename(f'{self.root}/raw/files/ligands.smi', f'{self.root}/raw/files/ligands_{target_id}.smi')
-            # grab decoys
-            download_url(f"https://dudez.docking.org/property_matched/{target_id}_new_DUDE_1/decoys.smi", f"{self.root}/raw/files/", verbosity=0)
-            os.rename(f'{self.root}/raw/files/decoys.smi', f'{self.root}/raw/files/decoys_{target_id}.smi')
+    def write_molecule_tables(self):
+        """ Collects the SMILES strings and identifiers of the ligands and decoys of all targets into the string tables `{root}/{name}.molecules.smiles` and `{root}/{name}.molecules.ids` (see :meth:`proteinshake.utils.write_string_table`). The range of each target in the tables is saved to `{root}/raw/molecules.json`.
+        """
+        smiles, ids, index = [], [], {}
+        for path in sorted(self.get_raw_files()):
+            target = self.get_id_from_filename(os.path.basename(path))
+            index[target] = {}
+            for mode in ['ligands', 'decoys']:
+                start = len(ids)
+                with open(f'{self.root}/raw/files/{mode}_{target}.smi', 'r') as mols:
+                    for line in mols:
+                        if line.strip() == '': continue
+                        smile, mol_id = line.split()
+                        smiles.append(smile)
+                        ids.append(mol_id)
+                index[target][mode] = [start, len(ids)]
+        write_string_table(smiles, f'{self.root}/{self.name}.molecules.smiles')
+        write_string_table(ids, f'{self.root}/{self.name}.molecules.ids')
+        save(index, f'{self.root}/raw/molecules.json')
+
+    def molecule_tables(self):
+        """ Returns the string tables of the SMILES strings and identifiers of all molecules. They are downloaded with the precomputed dataset if necessary.
+
+        Returns
+        -------
+        tuple
+            The :class:`~proteinshake.utils.StringTable` of the SMILES strings and of the identifiers.
+        """
+        if self._molecule_tables is None:
+            path = f'{self.root}/{self.name}.molecules'
+            for table in ['smiles', 'ids']:
+                for extension in ['bin', 'offsets.npy']:
+                    if os.path.exists(f'{path}.{table}.{extension}'): continue
+                    if self.use_precomputed:
+                        download_url(f'{self.repository_url}/{self.name}.molecules.{table}.{extension}.gz', self.root, verbosity=0, decompress=True)
+                    else:
+                        self.write_molecule_tables()
+            self._molecule_tables = (StringTable(f'{path}.smiles'), StringTable(f'{path}.ids'))
+        return self._molecule_tables
 
+    def molecules(self, protein, mode='ligands'):
+        """ Returns the SMILES strings and identifiers of the ligands or decoys of a protein.
+
+        Parameters
+        ----------
+        protein: dict
+            A protein object.
+        mode: str, default 'ligands'
+            Either 'ligands' or 'decoys'.
+
+        Returns
+        -------
+        tuple
+            The list of SMILES strings and the list of identifiers.
+        """
+        if f'{mode}_smiles' in protein['protein']: # precomputed before the molecules were stored in string tables
+            return protein['protein'][f'{mode}_smiles'], protein['protein'][f'{mode}_ids']
+        smiles, ids = self.molecule_tables()
+        start, end = protein['protein'][f'{mode}_index']
+        return smiles[start:end], ids[start:end]
 
     def add_protein_attributes(self, protein):
-        """ We annotate each protein with a list of decoys and a list of active SMILES strings and molecule IDs.
+        """ We annotate each protein with the range of its decoys and actives in the molecule tables, see :meth:`molecules`.
         """
+        if self._molecule_index is None:
+            if not os.path.exists(f'{self.root}/raw/molecules.json'):
+                self.write_molecule_tables()
+            self._molecule_index = load(f'{self.root}/raw/molecules.json')
         target = protein['protein']['ID']
 
         for mode in ['decoys', 'ligands']:
-            with open(f"{self.root}/raw/files/{mode}_{target}.smi", "r") as mols:
-                smiles, ids = [], []
-                for line in mols:
-                    smile, mol_id = line.split()
-                    smiles.append(smile)
-                    ids.append(mol_id)
-
-            protein['protein'][f'{mode}_smiles'] = smiles
-            protein['protein'][f'{mode}_ids'] = ids
-            protein['protein'][f'num_{mode}'] = len(ids)
+            start, end = self._molecule_index[target][mode]
+            protein['protein'][f'{mode}_index'] = [start, end]
+            protein['protein'][f'num_{mode}'] = end - start
 
         protein['protein']['num_mols'] = protein['protein']['num_ligands'] + protein['protein']['num_decoys']
         return protein
@@ -11,7 +11,7 @@ from sklearn.neighbors import KDTree
 import numpy as np
 
 from proteinshake.datasets import Dataset
-from proteinshake.utils import extract_tar, download_url, progressbar, load, save, unzip_file
+from proteinshake.utils import extract_tar, download_url, progressbar, load, save
 
 class ProteinProteinInterfaceDataset(Dataset):
     """ Protein-protein complexes from PDBBind with annotated interfaces.
@@ -80,8 +80,7 @@ class ProteinProteinInterfaceDataset(Dataset):
                 if not self.use_precomputed:
                     self.parse_interfaces()
                 else:
-                    download_url(f'{self.repository_url}/{filename}.gz', f'{self.root}', verbosity=0)
-                    unzip_file(f'{self.root}/{filename}.gz')
+                    download_url(f'{self.repository_url}/{filename}.gz', f'{self.root}', verbosity=0, decompress=True)
             return load(f'{self.root}/{filename}')
 
         self._interfaces = download_file(f'{self.name}.interfaces.json')
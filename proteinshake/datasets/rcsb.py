@@ -1,9 +1,9 @@
 import requests, glob, json, os, random
+from functools import cached_property
 import pandas as pd
-from joblib import Parallel, delayed
 
 from proteinshake.datasets import Dataset
-from proteinshake.utils import download_url, unzip_file, error, warning, progressbar
+from proteinshake.utils import BulkDownloader, get_http_cache, save, load, error, warning
 
 class RCSBDataset(Dataset):
     """ Experimental structures from the RCSB Protein Data Bank.
@@ -31,16 +31,31 @@ class RCSBDataset(Dataset):
     ----------
     query: list
         A list of triplets `(attribute, operator, value)` to be added to the REST API call to RCSB.
+    max_requests: int, default 20
+        The maximum number of concurrent requests to RCSB when downloading.
+    file_format: str, default 'pdb'
+        The structure file format to download, either ``'pdb'``, ``'cif'`` (mmCIF) or ``'bcif'`` (BinaryCIF). BinaryCIF files are the smallest and fastest to parse. Large entries that are not available in the legacy PDB format are downloaded as mmCIF instead.
     """
 
-    def __init__(self, query=[], from_list=None, only_single_chain=True, max_requests=20, **kwargs):
+    exlude_args_from_signature = ['file_format']
+    requests_per_second = 50 # average request rate limit of the RCSB downloads
+    rcsb_data_url = 'https://data.rcsb.org'
+    rcsb_files_url = 'https://files.rcsb.org'
+    rcsb_models_url = 'https://models.rcsb.org'
+    annotation_batch_size = 500 # number of entries per GraphQL annotation query
+    annotation_fields = 'rcsb_polymer_entity { rcsb_ec_lineage { depth id name } } rcsb_polymer_entity_annotation { annotation_id name type provenance_source assignment_version annotation_lineage { id name } }' # the GraphQL selection of the annotations
+
+    def __init__(self, query=[], from_list=None, only_single_chain=True, max_requests=20, file_format='pdb', **kwargs):
         self.query = query
         self.from_list = from_list
         self.max_requests = max_requests
+        if not file_format in ['pdb', 'cif', 'bcif']:
+            error(f'file_format must be one of \'pdb\', \'cif\' or \'bcif\', got {file_format}.')
+        self.file_format = file_format
         super().__init__(only_single_chain=only_single_chain, **kwargs)
 
     def get_raw_files(self):
-        return glob.glob(f'{self.root}/raw/files/*.pdb')
+        return [path for extension in ['pdb', 'cif', 'bcif'] for path in glob.glob(f'{self.root}/raw/files/*.{extension}') + glob.glob(f'{self.root}/raw/files/*.{extension}.gz')]
 
     def get_id_from_filename(self, filename):
         return filename[:4]
@@ -50,8 +65,6 @@ class RCSBDataset(Dataset):
         structures with a single chain.
         """
 
-        if self.n_jobs == 1:
-            warning('Downloading an RCSB dataset with use_precompute = False is very slow. Consider increasing n_jobs.', verbosity=self.verbosity)
         total = None
         i = 0
         batch_size = 5000
@@ -93,7 +106,7 @@ class RCSBDataset(Dataset):
                 },
                 "return_type": "polymer_entity"
             }
-            r = requests.get(f'https://search.rcsb.org/rcsbsearch/v2/query?json={json.dumps(payload)}')
+            r = get_http_cache().request('GET', f'https://search.rcsb.org/rcsbsearch/v2/query?json={json.dumps(payload)}')
             try:
                 response_dict = json.loads(r.text)
                 ids = [x['identifier'].split('_')[0] for x in response_dict['result_set']]
@@ -104,28 +117,106 @@ class RCSBDataset(Dataset):
         random.shuffle(ids) # for reproducible subsampling when using self.limit
         ids = ids[:self.limit] # for testing
 
-        n_jobs = min(self.n_jobs, self.max_requests) # RCSB has a request limit
-        if n_jobs < 1:
-            n_jobs = self.max_requests
+        self.download_entries(ids)
+
+    def download_entries(self, ids):
+        """ Downloads the annotations (see :meth:`download_annotations`) and structure files of RCSB entries concurrently with a :class:`~proteinshake.utils.BulkDownloader`. The annotation queries are sent through the HTTP cache (see :class:`~proteinshake.utils.HTTPCache`). At most `max_requests` requests are in flight at a time, at an average of at most `requests_per_second`. Entries without annotation are skipped.
 
-        failed = Parallel(n_jobs=n_jobs)(delayed(self.download_from_rcsb)(id) for id in progressbar(ids, desc='Downloading PDBs', verbosity=self.verbosity))
+        Parameters
+        ----------
+        ids: list
+            The PDB identifiers.
+        """
+        with BulkDownloader(max_concurrency=self.max_requests, rate_limit=self.requests_per_second, cache=get_http_cache()) as downloader:
+            annotations = self.download_annotations(ids, downloader)
+            failed = [id for id in ids if not id in annotations]
+            failed += downloader.map(lambda id: self.download_from_rcsb(id, downloader), [id for id in ids if id in annotations], desc='Downloading PDBs', verbosity=self.verbosity)
         failed = [f for f in failed if not f is True]
         if len(failed) > 0 and self.verbosity > 0:
             print(f'Failed to download {len(failed)} PDB files.')
 
+    def download_annotations(self, ids, downloader):
+        """ Fetches the annotations of the first polymer entity of RCSB entries with batched GraphQL queries of `annotation_batch_size` entries each, selecting the `annotation_fields`. The annotations are saved to a single file `{root}/raw/annotations.json`, which maps the identifiers to the annotations and is read with :meth:`get_annotation`.
+
+        Parameters
+        ----------
+        ids: list
+            The PDB identifiers.
+        downloader: BulkDownloader
+            The downloader to send the queries with.
 
-    def download_from_rcsb(self, id):
+        Returns
+        -------
+        dict
+            The annotations of all entries that were found.
+        """
+        query = f'query($ids: [String!]!) {{ polymer_entities(entity_ids: $ids) {{ rcsb_id {self.annotation_fields} }} }}'
+        def fetch(batch):
+            entity_ids = {f'{id}_1'.upper(): id for id in batch}
+            try:
+                response = downloader.post(f'{self.rcsb_data_url}/graphql', json={'query': query, 'variables': {'ids': list(entity_ids)}}, cacheable=True).json()
+            except Exception as e:
+                warning(f'Failed to download annotations: {e}', verbosity=self.verbosity)
+                return {}
+            entities = (response.get('data') or {}).get('polymer_entities') or []
+            return {entity_ids[entity.pop('rcsb_id').upper()]: drop_none(entity) for entity in entities if not entity is None}
+        batches = [ids[i:i+self.annotation_batch_size] for i in range(0, len(ids), self.annotation_batch_size)]
+        annotations = {}
+        for batch in downloader.map(fetch, batches, desc='Downloading annotations', verbosity=self.verbosity):
+            annotations.update(batch)
+        save(annotations, f'{self.root}/raw/annotations.json')
+        self.annotations = annotations
+        return annotations
+
+    @cached_property
+    def annotations(self):
+        path = f'{self.root}/raw/annotations.json'
+        return load(path) if os.path.exists(path) else None
+
+    def get_annotation(self, id):
+        """ Returns the RCSB annotation of an entry from the annotations file, which is loaded into memory once. Falls back to reading `{id}.annot.json` from the raw files for data downloaded without an annotations file.
+
+        Parameters
+        ----------
+        id: str
+            The PDB identifier.
+
+        Returns
+        -------
+        dict
+            The annotation of the first polymer entity.
+        """
+        if self.annotations is None:
+            with open(f'{self.root}/raw/files/{id}.annot.json','r') as file:
+                return json.load(file)
+        return self.annotations[id]
+
+    def download_from_rcsb(self, id, downloader):
+        urls = {
+            'pdb': f'{self.rcsb_files_url}/download/{id}.pdb.gz',
+            'cif': f'{self.rcsb_files_url}/download/{id}.cif.gz',
+            'bcif': f'{self.rcsb_models_url}/{id}.bcif.gz',
+        }
+        # large entries are not available in the legacy PDB format
+        formats = [self.file_format] + (['cif'] if self.file_format == 'pdb' else [])
         try:
-            r = requests.get(f'https://data.rcsb.org/rest/v1/core/polymer_entity/{id}/1')
-            obj = json.loads(r.text)
-            download_url(f'https://files.rcsb.org/download/{id}.pdb.gz', f'{self.root}/raw/files', verbosity=0)
-            unzip_file(f'{self.root}/raw/files/{id}.pdb.gz')
-            with open(f'{self.root}/raw/files/{id}.annot.json', 'w') as file:
-                json.dump(obj, file)
+            for i, file_format in enumerate(formats):
+                try:
+                    downloader.download(urls[file_format], f'{self.root}/raw/files') # kept compressed, parsing reads the .gz files directly
+                    break
+                except requests.HTTPError:
+                    if i == len(formats) - 1: raise
             return True
-        except KeyboardInterrupt:
-            exit()
         except Exception as e:
-            if os.path.exists(f'{self.root}/raw/files/{id}.pdb.gz'):
-                os.remove(f'{self.root}/raw/files/{id}.pdb.gz')
+            for file_format in formats:
+                if os.path.exists(f'{self.root}/raw/files/{id}.{file_format}.gz'):
+                    os.remove(f'{self.root}/raw/files/{id}.{file_format}.gz')
             return id
+
+def drop_none(obj):
+    """ Recursively removes `None` values from the dictionaries in a GraphQL response, which the REST API omits. """
+    if type(obj) == dict:
+        return {k: drop_none(v) for k, v in obj.items() if not v is None}
+    if type(obj) == list:
+        return [drop_none(v) for v in obj]
+    return obj
@@ -1,10 +1,9 @@
 import pandas as pd
-from joblib import Parallel, delayed
 
 from tqdm import tqdm
 
 from proteinshake.datasets import RCSBDataset
-from proteinshake.utils import download_url, progressbar
+from proteinshake.utils import download_url
 
 class SCOPDataset(RCSBDataset):
     """ Proteins with annotated SCOP class.
@@ -63,14 +62,8 @@ class SCOPDataset(RCSBDataset):
         ids = list(self.scop['FA-PDBID'].unique())
 
         # get the proteins
-        if self.n_jobs == 1:
-            print('Warning: Downloading an RCSB dataset with use_precompute = False is very slow. Consider increasing n_jobs.')
         ids = ids[:self.limit] # for testing
-
-        failed = Parallel(n_jobs=self.n_jobs)(delayed(self.download_from_rcsb)(id) for id in progressbar(ids, desc='Downloading PDBs', verbosity=verbosity))
-        failed = [f for f in failed if not f is True]
-        if len(failed)>0:
-            print(f'Failed to download {len(failed)} PDB files.')
+        self.download_entries(ids)
 
     def add_protein_attributes(self, protein):
         """ We annotate the protein with the scop classifications at each level.
@@ -21,10 +21,13 @@ from proteinshake.utils import (extract_tar,
                                 download_url,
                                 save,
                                 load,
-                                unzip_file,
                                 global_distance_test,
                                 local_distance_difference_test,
-                                progressbar
+                                progressbar,
+                                read_raw_file,
+                                read_cif_atoms,
+                                read_bcif_atoms,
+                                write_pdb_atoms
                                 )
 
 
@@ -85,8 +88,7 @@ class TMAlignDataset(RCSBDataset):
 
         def download_file(filename):
             if not os.path.exists(f'{self.root}/{filename}'):
-                download_url(f'{self.repository_url}/{filename}.gz', f'{self.root}', verbosity=0)
-                unzip_file(f'{self.root}/{filename}.gz')
+                download_url(f'{self.repository_url}/{filename}.gz', f'{self.root}', verbosity=0, decompress=True)
             return load(f'{self.root}/{filename}')
 
         self._tm_score = download_file(f'{self.name}.tmscore.npy')
@@ -104,12 +106,13 @@ class TMAlignDataset(RCSBDataset):
             return
         pdbids = [p['protein']['ID'] for p in self.proteins()]
         path_dict = {self.get_id_from_filename(os.path.basename(f)):f for f in self.get_raw_files()}
-        paths = [path_dict[id] for id in pdbids]
-        num_proteins = len(paths)
+        num_proteins = len(pdbids)
         combinations = np.array(list(itertools.combinations(range(num_proteins), 2)))
         TM, RMSD, GDT, LDDT = [np.ones((num_proteins,num_proteins), dtype=np.float16) * np.nan for _ in ['tm','rmsd','gdt','lddt']]
         np.fill_diagonal(TM, 1.0), np.fill_diagonal(RMSD, 0.0), np.fill_diagonal(GDT, 1.0), np.fill_diagonal(LDDT, 1.0)
-        d = Parallel(n_jobs=self.n_jobs)(delayed(tmalign_wrapper)(paths[i], paths[j]) for i,j in progressbar(combinations, desc='Aligning', verbosity=self.verbosity))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = [self.plain_pdb(path_dict[id], f'{tmpdir}/{id}.pdb') for id in pdbids]
+            d = Parallel(n_jobs=self.n_jobs)(delayed(tmalign_wrapper)(paths[i], paths[j]) for i,j in progressbar(combinations, desc='Aligning', verbosity=self.verbosity))
         x,y = tuple(combinations[:,0]), tuple(combinations[:,1])
         TM[x,y] = [x['TM1'] for x in d]
         TM[y,x] = [x['TM2'] for x in d]
@@ -125,6 +128,32 @@ class TMAlignDataset(RCSBDataset):
         np.save(f'{self.root}/{self.name}.gdt.npy', GDT)
         np.save(f'{self.root}/{self.name}.lddt.npy', LDDT)
 
+    def plain_pdb(self, path, out_path):
+        """ Returns the path of a structure as an uncompressed PDB file, which TMalign can read. Compressed files are decompressed, and mmCIF and BinaryCIF files are converted (see :meth:`proteinshake.utils.write_pdb_atoms`), to `out_path`.
+
+        Parameters
+        ----------
+        path: str
+            The path of the raw structure file, see :meth:`get_raw_files`.
+        out_path: str
+            The path of the PDB file, if the structure has to be converted.
+
+        Returns
+        -------
+        str
+            The path of the PDB file.
+        """
+        if path.endswith('.pdb') and os.path.isfile(path):
+            return path
+        if path.endswith(('.cif', '.cif.gz')):
+            write_pdb_atoms(read_cif_atoms(path), out_path)
+        elif path.endswith(('.bcif', '.bcif.gz')):
+            write_pdb_atoms(read_bcif_atoms(path), out_path)
+        else:
+            with open(out_path, 'wb') as file:
+                file.write(read_raw_file(path))
+        return out_path
+
     def tm_score(self, protein_1, protein_2):
         return self._tm_score[self.protein_ids.index(protein_1)][self.protein_ids.index(protein_2)]
     
@@ -142,9 +171,9 @@ def tmalign_wrapper(pdb1, pdb2):
     Parameters
     ----------
     pdb1: str
-        Path to PDB.
+        Path to an uncompressed PDB file, see :meth:`TMAlignDataset.plain_pdb`.
     pdb2 : str
-        Path to PDB.
+        Path to an uncompressed PDB file.
     return_superposition: bool
         If True, returns a protein dataframe with superposed structures.
     Returns
@@ -1,13 +1,28 @@
-import os
+import os, pickle, itertools, mmap
+import numpy as np
+import multiprocessing as mp
+from collections import deque
+from joblib import effective_n_jobs
 from proteinshake.utils import save, load, fx2str, progressbar, error
 
+def init_convert_worker(dataset, construct):
+    """ Initializes a conversion worker process with the framework dataset, see :meth:`FrameworkDataset.convert`. """
+    global convert_worker_dataset, convert_worker_construct
+    convert_worker_dataset, convert_worker_construct = dataset, construct
+
+def convert_chunk(items):
+    """ Constructs and converts a chunk of items in a worker process and pickles the results, see :meth:`FrameworkDataset.convert`. """
+    return [None if result is None else pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL) for result in convert_worker_dataset.convert_items(items, convert_worker_construct)]
+
 class FrameworkDataset():
     """ Dataset base class for different frameworks.
 
+    The converted items are pickled and packed into a few large files `{path}/data.{i}.bin` of at most `max_file_size` bytes, together with an index `{path}/index.npy` that holds the file number, byte offset, and length of each item. Accessing an item reads only its byte range, optionally from a memory map. Datasets that were converted with an earlier version, stored as one pickle file per item, are packed on first access (see :meth:`migrate`).
+
     Parameters
     ----------
     data_list: generator
-        A generator of objects from a representation.
+        A generator of objects from a representation, or of proteins if `construct` is given.
     size: int
         The size of the dataset.
     path: str
@@ -18,33 +33,208 @@ class FrameworkDataset():
         A transform function to be applied before writing the data. Signature: transform((data, protein_dict)) -> (data, protein_dict)
     pre_filter: function
         A filter function to be applied before writing the data. Signature: transform(data, protein_dict) -> bool
+    construct: function, optional
+        A function that constructs the representation objects of a list of proteins. If given, `data_list` holds proteins, whose representations are constructed together with the conversion (on the worker processes with `n_jobs > 1`).
+    n_jobs: int, default 1
+        The number of worker processes for the conversion, see :meth:`convert`. The functions passed to the dataset must be picklable if processes are not forked.
+    chunk_size: int, default 64
+        The number of items that a worker constructs and converts at once.
+    mmap: bool, default False
+        Whether to memory-map the data files instead of reading each item with a system call.
+    max_file_size: int, default 1073741824
+        The maximum size of a data file in bytes.
+    batch_transform: function, optional
+        A transform function to be applied once per batch in :meth:`get_batch`, instead of `transform`. Signature: batch_transform(batch) -> batch
     """
 
-    def __init__(self, data_list, size, path, transform=None, pre_transform=None, pre_filter=None, verbosity=2):
+    def __init__(self, data_list, size, path, transform=None, pre_transform=None, pre_filter=None, construct=None, n_jobs=1, chunk_size=64, mmap=False, max_file_size=1024**3, batch_transform=None, verbosity=2):
         os.makedirs(path, exist_ok=True)
         self.verbosity = verbosity
         self.path = path
         self.transform = transform
         self.pre_transform = pre_transform
         self.pre_filter = pre_filter
+        self.batch_transform = batch_transform
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
+        self.mmap = mmap
+        self.max_file_size = max_file_size
+        self._files = {}
         transforms_repr = fx2str(pre_transform) + fx2str(pre_filter)
-        if not os.path.exists(f'{path}/{size-1}.pkl'):
-            i = 0
-            for data_item in progressbar(data_list, desc='Converting', total=size, verbosity=self.verbosity):
-                data = self.convert_to_framework(data_item)
-                protein_dict = data_item.protein_dict
-                if not self.pre_filter is None and not self.pre_filter(data, protein_dict):
-                    continue
-                if not self.pre_transform is None:
-                    data, protein_dict = self.pre_transform(data, protein_dict)
-                save((data, protein_dict), f'{path}/{i}.pkl')
-                i += 1
-            save(i,f'{path}/size.pkl')
-            save(transforms_repr,f'{path}/transforms.pkl')
-        self.size = load(f'{path}/size.pkl')
+        if not self.is_stored():
+            if os.path.exists(f'{path}/size.pkl'):
+                self.migrate()
+            else:
+                save(transforms_repr,f'{path}/transforms.pkl')
+                self.write(progressbar(self.convert(data_list, construct), desc='Converting', total=size, verbosity=self.verbosity))
+        self.size = self.load_storage()
         original_repr = load(f'{path}/transforms.pkl')
         if not original_repr == transforms_repr: error(f'The pre_transform and/or pre_filter are not the same as when the dataset was created. If you want to change them, delete the folder at {path}', verbosity=self.verbosity)
 
+    def convert(self, data_list, construct=None):
+        """ Constructs and converts the items on `n_jobs` worker processes. The items are consumed lazily in chunks of `chunk_size`, with at most `2 * n_jobs` chunks in flight, and the results are returned in the order of `data_list` regardless of which worker finishes first, such that the indices of the converted dataset are deterministic.
+
+        Parameters
+        ----------
+        data_list: iterable
+            The representation objects, or proteins if `construct` is given.
+        construct: function, optional
+            A function that constructs the representation objects of a list of proteins.
+
+        Returns
+        -------
+        generator
+            The pickled `(data, protein_dict)` tuples, or `None` for items that were removed by `pre_filter`.
+        """
+        n_jobs = effective_n_jobs(self.n_jobs)
+        items = iter(data_list)
+        chunks = iter(lambda: list(itertools.islice(items, self.chunk_size)), [])
+        if n_jobs == 1:
+            for chunk in chunks:
+                for result in self.convert_items(chunk, construct):
+                    yield None if result is None else pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+            return
+        with mp.Pool(n_jobs, initializer=init_convert_worker, initargs=(self, construct)) as pool:
+            pending = deque(pool.apply_async(convert_chunk, (chunk,)) for chunk in itertools.islice(chunks, 2 * n_jobs))
+            while len(pending) > 0:
+                results = pending.popleft().get()
+                for chunk in itertools.islice(chunks, 1):
+                    pending.append(pool.apply_async(convert_chunk, (chunk,)))
+                yield from results
+
+    def is_stored(self):
+        """ Returns whether the converted dataset is stored completely.
+        """
+        return os.path.exists(f'{self.path}/index.npy')
+
+    def load_storage(self):
+        """ Opens the stored dataset and returns its size.
+        """
+        self.index = np.load(f'{self.path}/index.npy')
+        return len(self.index)
+
+    def load_item(self, idx):
+        """ Loads the `(data, protein_dict)` tuple at position `idx` from the storage.
+        """
+        return pickle.loads(self.read(idx))
+
+    def load_items(self, indices):
+        """ Loads the `(data, protein_dict)` tuples at the positions `indices` from the storage, see :meth:`read_batch`.
+        """
+        return [pickle.loads(item) for item in self.read_batch(indices)]
+
+    def write(self, items):
+        """ Packs pickled items into the data files and writes the index. The index is written last, such that an interrupted conversion is started over.
+
+        Parameters
+        ----------
+        items: iterable
+            The pickled items. `None` items are skipped.
+        """
+        index, file, number, position = [], None, -1, 0
+        try:
+            for item in items:
+                if item is None: # filtered
+                    continue
+                if file is None or (position > 0 and position + len(item) > self.max_file_size):
+                    if not file is None: file.close()
+                    number, position = number + 1, 0
+                    file = open(f'{self.path}/data.{number}.bin', 'wb')
+                file.write(item)
+                index.append((number, position, len(item)))
+                position += len(item)
+        finally:
+            if not file is None: file.close()
+        with open(f'{self.path}/index.npy.tmp', 'wb') as file:
+            np.save(file, np.array(index, dtype=np.int64).reshape(-1, 3))
+        os.replace(f'{self.path}/index.npy.tmp', f'{self.path}/index.npy')
+
+    def migrate(self):
+        """ Packs a dataset that was converted with an earlier version, stored as one pickle file `{path}/{i}.pkl` per item, into the data files, and removes the pickle files.
+        """
+        size = load(f'{self.path}/size.pkl')
+        def read(i):
+            with open(f'{self.path}/{i}.pkl', 'rb') as file:
+                return file.read()
+        self.write(progressbar((read(i) for i in range(size)), desc='Migrating', total=size, verbosity=self.verbosity))
+        for i in range(size):
+            os.remove(f'{self.path}/{i}.pkl')
+        os.remove(f'{self.path}/size.pkl')
+
+    def read(self, idx):
+        """ Reads the pickled item at position `idx` from its data file.
+        """
+        number, offset, length = (int(x) for x in self.index[idx])
+        return self.read_range(number, offset, length)
+
+    def read_batch(self, indices):
+        """ Reads the pickled items at the positions `indices`. The items are read in the order in which they are stored, and items that are stored next to each other are read at once.
+
+        Parameters
+        ----------
+        indices: list
+            The positions of the items.
+
+        Returns
+        -------
+        list
+            The pickled items, in the order of `indices`.
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        indices = np.where(indices < 0, indices + self.size, indices)
+        unique, inverse = np.unique(indices, return_inverse=True) # sorted positions are in storage order
+        entries = self.index[unique]
+        # a run of adjacent items ends where the file changes or the next item does not start at the end of the previous one
+        ends = entries[:, 1] + entries[:, 2]
+        breaks = np.flatnonzero((entries[1:, 0] != entries[:-1, 0]) | (entries[1:, 1] != ends[:-1])) + 1
+        items = []
+        for run in np.split(np.arange(len(entries)), breaks):
+            if len(run) == 0: continue
+            number, start, end = int(entries[run[0], 0]), int(entries[run[0], 1]), int(ends[run[-1]])
+            data = memoryview(self.read_range(number, start, end - start))
+            items += [data[entries[i, 1] - start:ends[i] - start] for i in run]
+        return [items[i] for i in inverse.reshape(-1)]
+
+    def read_range(self, number, offset, length):
+        """ Reads `length` bytes at `offset` from the data file `number`.
+        """
+        if not number in self._files:
+            file = open(f'{self.path}/data.{number}.bin', 'rb', buffering=0)
+            if self.mmap:
+                with file:
+                    self._files[number] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._files[number] = file
+        file = self._files[number]
+        if self.mmap:
+            return file[offset:offset+length]
+        if hasattr(os, 'pread'): # positionless, such that the file can be shared with forked data loader workers
+            return os.pread(file.fileno(), length, offset)
+        with open(f'{self.path}/data.{number}.bin', 'rb') as file:
+            file.seek(offset)
+            return file.read(length)
+
+    def __getstate__(self):
+        # open files and memory maps are not picklable and are reopened on access
+        state = self.__dict__.copy()
+        state['_files'] = {}
+        return state
+
+    def convert_items(self, items, construct=None):
+        """ Constructs the representation objects of a list of items if `construct` is given, converts them to the framework, and applies `pre_filter` and `pre_transform`. Items that are removed by `pre_filter` are returned as `None`.
+        """
+        results = []
+        for data_item in (items if construct is None else construct(items)):
+            data = self.convert_to_framework(data_item)
+            protein_dict = data_item.protein_dict
+            if not self.pre_filter is None and not self.pre_filter(data, protein_dict):
+                results.append(None)
+                continue
+            if not self.pre_transform is None:
+                data, protein_dict = self.pre_transform(data, protein_dict)
+            results.append((data, protein_dict))
+        return results
+
     def convert_to_framework(self, data_item):
         """ Converts data_item to a data object of the framework.
         """
@@ -58,14 +248,43 @@ class FrameworkDataset():
     def __len__(self):
         return self.size
 
+    def get_batch(self, indices, collate=True):
+        """ Returns the items at the positions `indices` at once. The items are read in bulk (see :meth:`read_batch`) and, with `collate=True`, collated into a single batch object of the framework (see :meth:`collate_batch`), such that no per-sample collation is needed in the training loop. If a `batch_transform` is given, it is applied once to the collated batch instead of applying `transform` to each item.
+
+        Parameters
+        ----------
+        indices: list
+            The positions of the items.
+        collate: bool, default True
+            Whether to collate the items. If `False`, a list of items is returned, as from indexing with a list.
+
+        Returns
+        -------
+        object
+            The batch, or the list of items.
+        """
+        if len(indices) > 0 and (np.max(indices) > self.size - 1 or np.min(indices) < -self.size):
+            raise IndexError(f'Index out of range for dataset of size {self.size}.')
+        items = [self.load_transform(*item) for item in self.load_items(indices)]
+        if collate and not self.batch_transform is None:
+            return self.batch_transform(self.collate_batch(items))
+        if not self.transform is None:
+            items = [self.transform(item) for item in items]
+        return self.collate_batch(items) if collate else items
+
+    def collate_batch(self, items):
+        """ Collates a list of items into a batch. Returns the list itself, unless a framework defines a batch object.
+        """
+        return items
+
     def __getitem__(self, idx):
         try:
             idx = int(idx)
         except:
-            return [self.__getitem__(i) for i in idx]
+            return self.get_batch(idx, collate=False)
         if idx > self.size - 1:
             raise StopIteration
-        data, protein_dict = self.load_transform(*load(f'{self.path}/{idx}.pkl'))
+        data, protein_dict = self.load_transform(*self.load_item(idx))
         if not self.transform is None:
             return self.transform((data, protein_dict))
         else:
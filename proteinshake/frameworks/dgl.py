@@ -14,3 +14,10 @@ class DGLGraphDataset(FrameworkDataset, DGLDataset):
         if data_item.weighted_edges:
             data.ndata[f'{data_item.resolution}'] = torch.tensor(nodes).long()
         return data
+
+    def collate_batch(self, items):
+        """ Collates the items into a single batched graph (see :meth:`dgl.batch`), together with the list of protein dictionaries if the items are `(data, protein_dict)` tuples.
+        """
+        if len(items) > 0 and isinstance(items[0], tuple):
+            return dgl.batch([data for data, _ in items]), [protein_dict for _, protein_dict in items]
+        return dgl.batch(items)
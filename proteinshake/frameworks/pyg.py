@@ -1,17 +1,89 @@
+import os
+import pickle
 import torch
 from torch_geometric.utils import from_scipy_sparse_matrix
-from torch_geometric.data import Data, Dataset as PygDataset
+from torch_geometric.data import Data, Batch, Dataset as PygDataset
+from torch_geometric.data.collate import collate
+from torch_geometric.data.separate import separate
 from proteinshake.frameworks.dataset import FrameworkDataset
+from proteinshake.utils import save, load
+
+# memory-mapped loading with torch.load is available from PyTorch 2.1
+TORCH_MMAP = tuple(int(v) for v in torch.__version__.split('+')[0].split('.')[:2]) >= (2, 1)
 
 
 class PygGraphDataset(FrameworkDataset, PygDataset):
     """ Graph dataset for PyG.
+
+    With `collated=True`, the graphs are stored collated like in :class:`torch_geometric.data.InMemoryDataset`: the attributes of all graphs are concatenated into one tensor each (`x`, `edge_index`, `edge_attr`), together with slice pointers that mark the graphs, and saved in a single file `{path}/collated.pt`. Accessing a graph is then a tensor slice instead of unpickling it. With PyTorch 2.1 or later, the file is memory-mapped on load; with earlier versions, it is loaded into memory completely. All graphs are held in memory once while they are collated. The collated dataset is stored in its own directory (`.pyg_collated` instead of `.pyg`, see :meth:`proteinshake.representations.GraphDataset.pyg`).
+
+    Parameters
+    ----------
+    collated: bool, default False
+        Whether to store the graphs collated in a single file.
     """
 
+    def __init__(self, *args, collated=False, **kwargs):
+        self.collated = collated
+        super().__init__(*args, **kwargs)
+
     def convert_to_framework(self, data_item):
         nodes, adj = data_item.data
+        edge_index, edge_weight = from_scipy_sparse_matrix(adj)
         return Data(
             x = torch.from_numpy(nodes),
-            edge_index = from_scipy_sparse_matrix(adj)[0].long(),
-            edge_attr = from_scipy_sparse_matrix(adj)[1].unsqueeze(1).float()
+            edge_index = edge_index.long(),
+            edge_attr = edge_weight.unsqueeze(1).float()
         )
+
+    def collate_batch(self, items):
+        """ Collates the items into a :class:`torch_geometric.data.Batch`, together with the list of protein dictionaries if the items are `(data, protein_dict)` tuples.
+        """
+        if len(items) > 0 and isinstance(items[0], tuple):
+            return Batch.from_data_list([data for data, _ in items]), [protein_dict for _, protein_dict in items]
+        return Batch.from_data_list(items)
+
+    def is_stored(self):
+        if not self.collated:
+            return super().is_stored()
+        return os.path.exists(f'{self.path}/collated.pt')
+
+    def write(self, items):
+        """ Stores the pickled items, collated into a single file with `collated=True`.
+        """
+        if not self.collated:
+            return super().write(items)
+        data_list, protein_dicts = [], []
+        for item in items:
+            if item is None: # filtered
+                continue
+            data, protein_dict = pickle.loads(item)
+            data_list.append(data)
+            protein_dicts.append(protein_dict)
+        data, slices = (Data(), {}) if len(data_list) == 0 else collate(Data, data_list, increment=False, add_batch=False)[:2]
+        save(protein_dicts, f'{self.path}/collated.proteins.pkl')
+        torch.save((data.to_dict(), slices), f'{self.path}/collated.pt.tmp')
+        os.replace(f'{self.path}/collated.pt.tmp', f'{self.path}/collated.pt')
+
+    def load_storage(self):
+        if not self.collated:
+            return super().load_storage()
+        if TORCH_MMAP:
+            data, self.slices = torch.load(f'{self.path}/collated.pt', mmap=True, weights_only=False)
+        else:
+            data, self.slices = torch.load(f'{self.path}/collated.pt')
+        self.collated_data = Data.from_dict(data)
+        self.protein_dicts = load(f'{self.path}/collated.proteins.pkl')
+        return len(self.protein_dicts)
+
+    def load_item(self, idx):
+        if not self.collated:
+            return super().load_item(idx)
+        idx = int(idx) % len(self.protein_dicts)
+        data = separate(cls=Data, batch=self.collated_data, idx=idx, slice_dict=self.slices, decrement=False)
+        return data, self.protein_dicts[idx]
+
+    def load_items(self, indices):
+        if not self.collated:
+            return super().load_items(indices)
+        return [self.load_item(idx) for idx in indices]
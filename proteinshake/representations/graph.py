@@ -1,10 +1,79 @@
 import os
-from sklearn.neighbors import kneighbors_graph, radius_neighbors_graph
+import itertools
+import functools
 from tqdm import tqdm
 import numpy as np
+from scipy.spatial import cKDTree
+from scipy.sparse import csr_matrix, coo_matrix
 
 from proteinshake.utils import tokenize, error
 
+def neighbor_graphs(coords, construction, k=None, eps=None, weighted_edges=False):
+    """ Constructs the k-NN or epsilon-neighborhood graphs of many proteins at once. The proteins are placed side by side, further apart than the largest protein diameter (plus `eps`), such that a single KD-tree over all proteins answers the neighbor queries of all nodes in one vectorized call without creating edges between proteins. Equivalent to :meth:`sklearn.neighbors.kneighbors_graph` and :meth:`sklearn.neighbors.radius_neighbors_graph` applied to each protein (up to the choice among equidistant neighbors), with `k` reduced to the number of nodes minus one for small proteins.
+
+    Parameters
+    ----------
+    coords: list
+        The node coordinates of each protein, as arrays of shape `(n, 3)`.
+    construction: str
+        Whether to use knn or eps construction.
+    k: int
+        The number of neighbors to be used in the k-NN graph.
+    eps: float
+        The epsilon radius to be used in graph construction (in Angstrom).
+    weighted_edges: bool, default False
+        If `True`, edges are attributed with their euclidean distance. If `False`, edges have weight 1.
+
+    Returns
+    -------
+    list
+        The adjacency matrix of each protein in CSR format.
+    """
+    coords = [np.asarray(c, dtype=np.float64).reshape(-1, 3) for c in coords]
+    sizes = np.array([len(c) for c in coords], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    total = int(offsets[-1])
+    if total == 0:
+        return [csr_matrix((n, n)) for n in sizes]
+    # place the proteins side by side along the x axis
+    lower = np.array([c.min(0) if len(c) > 0 else np.zeros(3) for c in coords])
+    extent = np.array([c.max(0) if len(c) > 0 else np.zeros(3) for c in coords]) - lower
+    gap = np.linalg.norm(extent, axis=1).max() + (eps if construction == 'eps' else 0) + 1
+    shift = -lower
+    shift[:, 0] += np.concatenate([[0], np.cumsum(extent[:-1, 0] + gap)])
+    points = np.concatenate(coords) + np.repeat(shift, sizes, axis=0)
+    tree = cKDTree(points)
+    if construction == 'eps':
+        pairs = tree.query_pairs(r=eps, output_type='ndarray')
+        distances = np.linalg.norm(points[pairs[:, 0]] - points[pairs[:, 1]], axis=1) if weighted_edges else np.ones(len(pairs))
+        rows, cols = np.concatenate([pairs[:, 0], pairs[:, 1]]), np.concatenate([pairs[:, 1], pairs[:, 0]])
+        adj = coo_matrix((np.concatenate([distances, distances]), (rows, cols)), shape=(total, total)).tocsr()
+    elif construction == 'knn':
+        num_queried = min(k + 1, total)
+        distances, neighbors = tree.query(points, k=num_queried, workers=-1)
+        distances, neighbors = distances.reshape(total, num_queried), neighbors.reshape(total, num_queried)
+        # drop the node itself, or the farthest neighbor if the node is not among the results due to duplicate coordinates
+        keep = neighbors != np.arange(total)[:, None]
+        keep[keep.all(axis=1), -1] = False
+        # small proteins have fewer than k neighbors
+        num_neighbors = np.repeat(np.minimum(sizes - 1, k), sizes)
+        keep &= np.cumsum(keep, axis=1) <= num_neighbors[:, None]
+        indptr = np.concatenate([[0], np.cumsum(keep.sum(axis=1))])
+        data = distances[keep] if weighted_edges else np.ones(indptr[-1])
+        adj = csr_matrix((data, neighbors[keep], indptr), shape=(total, total))
+    else:
+        error(f'Unknown graph construction {construction}.')
+    # split into the graphs of the proteins
+    graphs = []
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        first, last = adj.indptr[start], adj.indptr[end]
+        graphs.append(csr_matrix((adj.data[first:last], adj.indices[first:last] - start, adj.indptr[start:end+1] - first), shape=(end - start, end - start)))
+    return graphs
+
+def protein_coords(protein):
+    resolution = 'atom' if 'atom' in protein else 'residue'
+    return np.stack([protein[resolution]['x'], protein[resolution]['y'], protein[resolution]['z']], axis=1)
+
 class Graph():
     """ Graph representation of a protein.
 
@@ -20,19 +89,16 @@ class Graph():
         The number of neighbors to be used in the k-NN graph.
     weighted_edges: bool, default False
         If `True`, edges are attributed with their euclidean distance. If `False`, edges are unweighted.
+    adj: scipy.sparse.csr_matrix, optional
+        The adjacency matrix, if it was already constructed with :meth:`neighbor_graphs`.
 
     """
 
-    def __init__(self, protein, construction, k, eps, weighted_edges):
+    def __init__(self, protein, construction, k, eps, weighted_edges, adj=None):
         resolution = 'atom' if 'atom' in protein else 'residue'
-        mode = 'distance' if weighted_edges else 'connectivity'
-        coords = np.stack([protein[resolution]['x'], protein[resolution]['y'], protein[resolution]['z']], axis=1)
         nodes = tokenize(protein[resolution][f'{resolution}_type'], resolution=resolution)
-        if construction == 'eps':
-            adj = radius_neighbors_graph(coords, radius=eps, mode=mode)
-        elif construction == 'knn':
-            n_neighbors = min(len(coords) - 1, k) # reduce k if protein is smaller than self.k
-            adj = kneighbors_graph(coords,  n_neighbors=n_neighbors, mode=mode)
+        if adj is None:
+            adj = neighbor_graphs([protein_coords(protein)], construction, k=k, eps=eps, weighted_edges=weighted_edges)[0]
         self.protein_dict = protein
         self.resolution = resolution
         self.data = (nodes, adj)
@@ -40,6 +106,36 @@ class Graph():
 
 
 
+def construct_graphs(proteins, construction, k=None, eps=None, weighted_edges=False, batch_size=64):
+    """ Constructs the graphs of a list of proteins, in batches of `batch_size` proteins whose neighbors are queried at once (see :meth:`neighbor_graphs`).
+
+    Parameters
+    ----------
+    proteins: list
+        The protein objects.
+    construction: str
+        Whether to use knn or eps construction.
+    k: int
+        The number of neighbors to be used in the k-NN graph.
+    eps: float
+        The epsilon radius to be used in graph construction (in Angstrom).
+    weighted_edges: bool, default False
+        If `True`, edges are attributed with their euclidean distance. If `False`, edges are unweighted.
+    batch_size: int, default 64
+        The number of proteins whose graphs are constructed at once.
+
+    Returns
+    -------
+    list
+        The :class:`Graph` objects.
+    """
+    graphs = []
+    for i in range(0, len(proteins), batch_size):
+        batch = proteins[i:i+batch_size]
+        adjs = neighbor_graphs([protein_coords(protein) for protein in batch], construction, k=k, eps=eps, weighted_edges=weighted_edges)
+        graphs += [Graph(protein, construction, k, eps, weighted_edges, adj=adj) for protein, adj in zip(batch, adjs)]
+    return graphs
+
 class GraphDataset():
     """ Graph representation of a protein structure dataset.
     Converts a protein object to a graph by using a k-nearest-neighbor or epsilon-neighborhood approach. Define either `k` or `eps` to determine which one is used.
@@ -60,28 +156,54 @@ class GraphDataset():
         The number of neighbors to be used in the k-NN graph.
     weighted_edges: bool, default False
         If `True`, edges are attributed with their euclidean distance. If `False`, edges are unweighted.
+    batch_size: int, default 64
+        The number of proteins whose graphs are constructed at once, see :meth:`neighbor_graphs`.
+
+    The framework methods take the optional arguments `shard` and `num_shards` to convert only one shard of the dataset, e.g. on each rank of a data parallel training job (see :meth:`proteinshake.datasets.Dataset.shard_bounds`). Each shard is stored separately. With the argument `n_jobs`, the graphs are constructed and converted on multiple processes (see :meth:`proteinshake.frameworks.dataset.FrameworkDataset.convert`).
 
     """
 
-    def __init__(self, proteins, root, name, resolution='residue', eps=None, k=None, weighted_edges=False, verbosity=2):
+    def __init__(self, proteins, root, name, resolution='residue', eps=None, k=None, weighted_edges=False, batch_size=64, verbosity=2):
         self.verbosity = verbosity
         if (eps is None and k is None): error('You must specify eps or k in the graph construction.', verbosity=self.verbosity)
         construction = 'knn' if not k is None else 'eps'
         param = k if construction == 'knn' else eps
         weighted = '_weighted' if weighted_edges else ''
         self.path = f'{root}/processed/graph/{name}_{resolution}_{construction}_{param}{weighted}'
-        self.graphs = (Graph(protein, construction, k, eps, weighted_edges) for protein in proteins)
+        self.proteins = proteins
+        self.batch_size = batch_size
+        self.construct_fn = functools.partial(construct_graphs, construction=construction, k=k, eps=eps, weighted_edges=weighted_edges, batch_size=batch_size)
+        self.graphs = self.construct(proteins)
         self.size = len(proteins)
         os.makedirs(os.path.dirname(self.path), exist_ok=True)
 
-    def pyg(self, *args, **kwargs):
+    def construct(self, proteins):
+        """ Lazily constructs the graphs of the proteins in batches of `batch_size`.
+        """
+        proteins = iter(proteins)
+        for batch in iter(lambda: list(itertools.islice(proteins, self.batch_size)), []):
+            yield from self.construct_fn(batch)
+
+    def shard(self, shard=None, num_shards=None):
+        """ Returns the proteins, size, and path of one shard of the dataset, or of the whole dataset if `shard` is `None`.
+        """
+        if shard is None and num_shards is None:
+            return self.proteins, self.size, self.path
+        proteins = self.proteins.shard(shard, num_shards)
+        return proteins, len(proteins), f'{self.path}_shard_{shard}_of_{num_shards}'
+
+    def pyg(self, *args, shard=None, num_shards=None, collated=False, **kwargs):
         from proteinshake.frameworks.pyg import PygGraphDataset
-        return PygGraphDataset(self.graphs, self.size, self.path+'.pyg', verbosity=self.verbosity, *args, **kwargs)
+        proteins, size, path = self.shard(shard, num_shards)
+        path += '.pyg_collated' if collated else '.pyg'
+        return PygGraphDataset(proteins, size, path, construct=self.construct_fn, collated=collated, verbosity=self.verbosity, *args, **kwargs)
 
-    def dgl(self, *args, **kwargs):
+    def dgl(self, *args, shard=None, num_shards=None, **kwargs):
         from proteinshake.frameworks.dgl import DGLGraphDataset
-        return DGLGraphDataset(self.graphs, self.size, self.path+'.dgl', verbosity=self.verbosity, *args, **kwargs)
+        proteins, size, path = self.shard(shard, num_shards)
+        return DGLGraphDataset(proteins, size, path+'.dgl', construct=self.construct_fn, verbosity=self.verbosity, *args, **kwargs)
 
-    def nx(self, *args, **kwargs):
+    def nx(self, *args, shard=None, num_shards=None, **kwargs):
         from proteinshake.frameworks.nx import NetworkxGraphDataset
-        return NetworkxGraphDataset(self.graphs, self.size, self.path+'.nx', verbosity=self.verbosity, *args, **kwargs)
+        proteins, size, path = self.shard(shard, num_shards)
+        return NetworkxGraphDataset(proteins, size, path+'.nx', construct=self.construct_fn, verbosity=self.verbosity, *args, **kwargs)
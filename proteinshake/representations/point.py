@@ -24,6 +24,21 @@ class Point():
 
 
 
+def construct_points(proteins):
+    """ Constructs the point clouds of a list of proteins.
+
+    Parameters
+    ----------
+    proteins: list
+        The protein objects.
+
+    Returns
+    -------
+    list
+        The :class:`Point` objects.
+    """
+    return [Point(protein) for protein in proteins]
+
 class PointDataset():
     """ Point representation of a protein structure dataset.
 
@@ -38,22 +53,37 @@ class PointDataset():
     resolution: str, default 'residue'
         Resolution of the proteins to use in the graph representation. Can be 'atom' or 'residue'.
 
+    The framework methods take the optional arguments `shard` and `num_shards` to convert only one shard of the dataset, and `n_jobs` to convert on multiple processes (see :meth:`proteinshake.representations.GraphDataset`).
+
     """
 
     def __init__(self, proteins, root, name, resolution='residue', verbosity=2):
         self.verbosity = verbosity
         self.path = f'{root}/processed/point/{name}_{resolution}'
+        self.proteins = proteins
+        self.construct_fn = construct_points
         self.points = (Point(protein) for protein in proteins)
         self.size = len(proteins)
 
-    def torch(self, *args, **kwargs):
+    def shard(self, shard=None, num_shards=None):
+        """ Returns the proteins, size, and path of one shard of the dataset, or of the whole dataset if `shard` is `None`.
+        """
+        if shard is None and num_shards is None:
+            return self.proteins, self.size, self.path
+        proteins = self.proteins.shard(shard, num_shards)
+        return proteins, len(proteins), f'{self.path}_shard_{shard}_of_{num_shards}'
+
+    def torch(self, *args, shard=None, num_shards=None, **kwargs):
         from proteinshake.frameworks.torch import TorchPointDataset
-        return TorchPointDataset(self.points, self.size, self.path+'.torch', verbosity=self.verbosity, *args, **kwargs)
+        proteins, size, path = self.shard(shard, num_shards)
+        return TorchPointDataset(proteins, size, path+'.torch', construct=self.construct_fn, verbosity=self.verbosity, *args, **kwargs)
 
-    def tf(self, *args, **kwargs):
+    def tf(self, *args, shard=None, num_shards=None, **kwargs):
         from proteinshake.frameworks.tf import TensorflowPointDataset
-        return TensorflowPointDataset(self.points, self.size, self.path+'.tf', verbosity=self.verbosity, *args, **kwargs)
+        proteins, size, path = self.shard(shard, num_shards)
+        return TensorflowPointDataset(proteins, size, path+'.tf', construct=self.construct_fn, verbosity=self.verbosity, *args, **kwargs)
 
-    def np(self, *args, **kwargs):
+    def np(self, *args, shard=None, num_shards=None, **kwargs):
         from proteinshake.frameworks.np import NumpyPointDataset
-        return NumpyPointDataset(self.points, self.size, self.path+'.np', verbosity=self.verbosity, *args, **kwargs)
+        proteins, size, path = self.shard(shard, num_shards)
+        return NumpyPointDataset(proteins, size, path+'.np', construct=self.construct_fn, verbosity=self.verbosity, *args, **kwargs)
@@ -1,5 +1,6 @@
 import os
 import itertools
+import functools
 from tqdm import tqdm
 import numpy as np
 
@@ -52,6 +53,16 @@ class Voxel():
 
 
 
+def construct_voxels(proteins, gridsize, voxelsize, aggregation):
+    """ Voxelizes a list of proteins, see :class:`Voxel` for arguments.
+
+    Returns
+    -------
+    list
+        The :class:`Voxel` objects.
+    """
+    return [Voxel(protein, gridsize, voxelsize, aggregation) for protein in proteins]
+
 class VoxelDataset():
     """ Voxel representation of a protein structure dataset.
     Voxelizes a protein structure by imposing a regular grid and determining the occupancy of a voxel with amino acids.
@@ -74,11 +85,14 @@ class VoxelDataset():
     aggregation: str, defaul 'mean'
         How to aggregate labels of a voxel.
 
+    The framework methods take the optional arguments `shard` and `num_shards` to convert only one shard of the dataset, and `n_jobs` to convert on multiple processes (see :meth:`proteinshake.representations.GraphDataset`). Pass `gridsize` explicitly when sharding, otherwise all proteins are read to determine it.
+
     """
 
     def __init__(self, proteins, root, name, resolution='residue', gridsize=None, voxelsize=10, aggregation='mean', verbosity=2):
         self.verbosity = verbosity
         self.size = len(proteins)
+        self.proteins = proteins
         if gridsize is None:
             proteins, proteins_copy = itertools.tee(proteins)
             gridsize = np.array([[
@@ -90,17 +104,30 @@ class VoxelDataset():
         gridsize = np.array(gridsize)
         gridsize_string = '_'.join(str(i) for i in gridsize)
         self.gridsize = gridsize
+        self.source = proteins
+        self.construct_fn = functools.partial(construct_voxels, gridsize=gridsize, voxelsize=voxelsize, aggregation=aggregation)
         self.voxels = (Voxel(protein, gridsize, voxelsize, aggregation) for protein in proteins)
         self.path = f'{root}/processed/voxel/{name}_{resolution}_voxelsize_{voxelsize}_gridsize_{gridsize_string}_aggregation_{aggregation}'
 
-    def torch(self, *args, **kwargs):
+    def shard(self, shard=None, num_shards=None):
+        """ Returns the proteins, size, and path of one shard of the dataset, or of the whole dataset if `shard` is `None`.
+        """
+        if shard is None and num_shards is None:
+            return self.source, self.size, self.path
+        proteins = self.proteins.shard(shard, num_shards)
+        return proteins, len(proteins), f'{self.path}_shard_{shard}_of_{num_shards}'
+
+    def torch(self, *args, shard=None, num_shards=None, **kwargs):
         from proteinshake.frameworks.torch import TorchVoxelDataset
-        return TorchVoxelDataset(self.voxels, self.size, self.path+'.torch', verbosity=self.verbosity, *args, **kwargs)
+        proteins, size, path = self.shard(shard, num_shards)
+        return TorchVoxelDataset(proteins, size, path+'.torch', construct=self.construct_fn, verbosity=self.verbosity, *args, **kwargs)
 
-    def tf(self, *args, **kwargs):
+    def tf(self, *args, shard=None, num_shards=None, **kwargs):
         from proteinshake.frameworks.tf import TensorflowVoxelDataset
-        return TensorflowVoxelDataset(self.voxels, self.size, self.path+'.tf', verbosity=self.verbosity, *args, **kwargs)
+        proteins, size, path = self.shard(shard, num_shards)
+        return TensorflowVoxelDataset(proteins, size, path+'.tf', construct=self.construct_fn, verbosity=self.verbosity, *args, **kwargs)
 
-    def np(self, *args, **kwargs):
+    def np(self, *args, shard=None, num_shards=None, **kwargs):
         from proteinshake.frameworks.np import NumpyVoxelDataset
-        return NumpyVoxelDataset(self.voxels, self.size, self.path+'.np', verbosity=self.verbosity, *args, **kwargs)
+        proteins, size, path = self.shard(shard, num_shards)
+        return NumpyVoxelDataset(proteins, size, path+'.np', construct=self.construct_fn, verbosity=self.verbosity, *args, **kwargs)
@@ -40,6 +40,7 @@ class VirtualScreenTask(Task):
     def __init__(self, *args, **kwargs):
         kwargs['split'] = 'none'
         super().__init__(*args, **kwargs)
+        self.decoys_dataset = self.dataset # keeps access to the molecules after conversion to a representation
         self.test_targets = [self.target(p) for p in self.proteins]
 
     @property
@@ -63,7 +64,7 @@ class VirtualScreenTask(Task):
         occupy the top of the list and the decoys occupy the rest.
         Since this is a zero-shot task we only use this internally for evaluation.
         """
-        return protein['protein']['ligands_smiles'] + protein['protein']['decoys_smiles']
+        return self.decoys_dataset.molecules(protein, 'ligands')[0] + self.decoys_dataset.molecules(protein, 'decoys')[0]
 
     @property
     def num_features(self):
@@ -1,5 +1,7 @@
 from .embeddings import *
+from .cache import *
 from .io import *
+from .download import *
 from .similarity import *
 from .uniprot import *
 
@@ -10,13 +12,35 @@ __all__ = ['onehot',
            'save',
            'load',
            'download_url',
+           'BulkDownloader',
+           'TokenBucket',
+           'HTTPCache',
+           'get_http_cache',
+           'set_http_cache',
            'extract_tar',
+           'list_tar',
+           'read_raw_file',
            'zip_file',
            'unzip_file',
            'write_avro',
+           'AvroWriter',
+           'index_avro',
+           'load_avro_index',
+           'read_avro_record',
+           'read_avro_records',
+           'write_columns',
+           'load_columns',
+           'write_column_release',
+           'write_string_table',
+           'StringTable',
            'uniprot_query',
+           'uniprot_query_pages',
            'uniprot_map',
-           'protein_to_pdb'
+           'protein_to_pdb',
+           'read_pdb_atoms',
+           'write_pdb_atoms',
+           'read_cif_atoms',
+           'read_bcif_atoms',
            ]
 
 classes = __all__
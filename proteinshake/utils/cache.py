@@ -0,0 +1,214 @@
+import os, json, time, hashlib, threading
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# status codes that are cached, following the heuristically cacheable codes of RFC 9110
+CACHEABLE_STATUS_CODES = [200, 203, 204, 300, 301, 404, 405, 410, 414, 501]
+
+class HTTPCache():
+    """ A persistent on-disk cache of HTTP responses, through which the metadata requests of the datasets and utilities are sent (queries, annotations, availability checks and small files). Large structure files, precomputed datasets and raw annotation files are not cached here, as they are stored in the dataset root anyway. Responses larger than `max_entry_size` bytes are never stored, such that a single large file cannot evict the rest of the cache.
+
+    Only GET and HEAD requests are cached by default. Other requests, such as POST queries, are only cached if `cacheable=True` is passed to :meth:`request`, in which case they are keyed on their body. This must only be used for requests without side effects, e.g. GraphQL queries, and not for requests that create server state such as jobs.
+
+    A cached response is served without contacting the server for `ttl` seconds. After that, it is revalidated with a conditional request (`If-None-Match` / `If-Modified-Since`) and only downloaded again if it has changed. If the server cannot be reached, stale responses are served instead. In offline mode, all responses are served from the cache regardless of their age, and uncached requests fail. When the cache exceeds `max_size` bytes, the least recently used responses are evicted.
+
+    Parameters
+    ----------
+    path: str, optional
+        The cache directory. Defaults to the `PROTEINSHAKE_CACHE` environment variable, or `~/.cache/proteinshake/http`.
+    ttl: float, default 86400
+        The number of seconds a response is served without revalidation.
+    max_size: int, default 1073741824
+        The maximum size of the cache in bytes.
+    max_entry_size: int, default 16777216
+        The maximum size of a single cached response in bytes.
+    offline: bool, optional
+        Whether to serve all requests from the cache, without network access. Defaults to `True` if the `PROTEINSHAKE_OFFLINE` environment variable is set to `1`.
+    """
+
+    def __init__(self, path=None, ttl=24*60*60, max_size=1024**3, max_entry_size=16*1024**2, offline=None):
+        self.path = path if not path is None else os.environ.get('PROTEINSHAKE_CACHE', os.path.expanduser('~/.cache/proteinshake/http'))
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_entry_size = max_entry_size
+        self.offline = offline if not offline is None else os.environ.get('PROTEINSHAKE_OFFLINE', '0') == '1'
+        self.lock = threading.Lock()
+
+    def key(self, method, url, **kwargs):
+        """ Returns the cache key of a request, which is a hash of the method, url, query parameters, and request body.
+        """
+        body = json.dumps([kwargs.get('params'), kwargs.get('data'), kwargs.get('json')], sort_keys=True, default=str)
+        return hashlib.md5(f'{method.upper()} {url} {body}'.encode('utf-8')).hexdigest()
+
+    def load(self, key):
+        """ Loads a cached response and its metadata, or returns `None` if it is not cached.
+        """
+        try:
+            with open(f'{self.path}/{key}.json', 'r') as file:
+                meta = json.load(file)
+            with open(f'{self.path}/{key}.body', 'rb') as file:
+                content = file.read()
+            os.utime(f'{self.path}/{key}.body') # marks the entry as recently used for the eviction
+        except (FileNotFoundError, ValueError):
+            return None
+        response = requests.Response()
+        response.status_code = meta['status_code']
+        response.reason = meta['reason']
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.encoding = meta['encoding']
+        response.url = meta['url']
+        response._content = content
+        response.from_cache = True
+        return meta, response
+
+    def store(self, key, response):
+        """ Stores a response in the cache and evicts old responses if the cache is full. Responses larger than `max_entry_size` are not stored.
+        """
+        if len(response.content) > self.max_entry_size: return
+        os.makedirs(self.path, exist_ok=True)
+        meta = {
+            'url': response.url,
+            'status_code': response.status_code,
+            'reason': response.reason,
+            'headers': dict(response.headers),
+            'encoding': response.encoding,
+            'time': time.time(),
+        }
+        tmp = f'{self.path}/{key}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as file:
+            file.write(response.content)
+        os.replace(tmp, f'{self.path}/{key}.body')
+        self.store_meta(key, meta)
+        self.evict()
+
+    def store_meta(self, key, meta):
+        """ Stores the metadata of a cached response.
+        """
+        tmp = f'{self.path}/{key}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as file:
+            json.dump(meta, file)
+        os.replace(tmp, f'{self.path}/{key}.json')
+
+    def evict(self):
+        """ Removes the least recently used responses until the cache is smaller than `max_size`.
+        """
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.path):
+                if not name.endswith('.body'): continue
+                try:
+                    stat = os.stat(f'{self.path}/{name}')
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name[:-len('.body')]))
+            size = sum(entry[1] for entry in entries)
+            for _, entry_size, key in sorted(entries):
+                if size <= self.max_size: break
+                for extension in ['json', 'body']:
+                    try:
+                        os.remove(f'{self.path}/{key}.{extension}')
+                    except FileNotFoundError:
+                        pass
+                size -= entry_size
+
+    def clear(self):
+        """ Removes all responses from the cache.
+        """
+        if not os.path.exists(self.path): return
+        for name in os.listdir(self.path):
+            if name.endswith(('.json', '.body')):
+                os.remove(f'{self.path}/{name}')
+
+    def lookup(self, method, url, **kwargs):
+        """ Returns a cached response regardless of its age, without contacting the server.
+
+        Parameters
+        ----------
+        method: str
+            The HTTP method.
+        url: str
+            The url.
+        **kwargs:
+            The request arguments (`params`, `data`, `json`) that identify the request.
+
+        Returns
+        -------
+        Response
+            The cached response, or `None` if the request is not cached.
+        """
+        cached = self.load(self.key(method, url, **kwargs))
+        return None if cached is None else cached[1]
+
+    def request(self, method, url, send=None, cacheable=None, **kwargs):
+        """ Sends a request through the cache.
+
+        Parameters
+        ----------
+        method: str
+            The HTTP method.
+        url: str
+            The url.
+        send: function, optional
+            The function that sends the request to the server, with the same signature as :meth:`requests.request` (the default).
+        cacheable: bool, optional
+            Whether the response is cached. Defaults to `True` for GET and HEAD requests and `False` otherwise. Only set it for requests without side effects.
+        **kwargs:
+            Passed on to `send`.
+
+        Returns
+        -------
+        Response
+            The response. Cached responses have the attribute `from_cache`.
+        """
+        send = requests.request if send is None else send
+        if cacheable is None:
+            cacheable = method.upper() in ['GET', 'HEAD']
+        if not cacheable:
+            return send(method, url, **kwargs)
+        key = self.key(method, url, **kwargs)
+        cached = self.load(key)
+        if not cached is None and (self.offline or time.time() - cached[0]['time'] < self.ttl):
+            return cached[1]
+        if self.offline:
+            raise requests.ConnectionError(f'{url} is not cached, and the HTTP cache is offline.')
+        headers = dict(kwargs.pop('headers', None) or {})
+        if not cached is None:
+            if 'ETag' in cached[1].headers: headers['If-None-Match'] = cached[1].headers['ETag']
+            if 'Last-Modified' in cached[1].headers: headers['If-Modified-Since'] = cached[1].headers['Last-Modified']
+        try:
+            response = send(method, url, headers=headers, **kwargs)
+        except requests.ConnectionError:
+            if cached is None: raise
+            return cached[1]
+        if response.status_code == 304 and not cached is None:
+            meta, response = cached
+            self.store_meta(key, {**meta, 'time': time.time()})
+        elif response.status_code in CACHEABLE_STATUS_CODES:
+            self.store(key, response)
+        return response
+
+http_cache = None
+
+def get_http_cache():
+    """ Returns the HTTP cache that is used by all datasets and utilities, see :class:`HTTPCache`. It is created with the default arguments on first use.
+
+    Returns
+    -------
+    HTTPCache
+        The HTTP cache.
+    """
+    global http_cache
+    if http_cache is None:
+        http_cache = HTTPCache()
+    return http_cache
+
+def set_http_cache(cache):
+    """ Sets the HTTP cache that is used by all datasets and utilities, e.g. to change its directory or to go offline.
+
+    Parameters
+    ----------
+    cache: HTTPCache
+        The HTTP cache.
+    """
+    global http_cache
+    http_cache = cache
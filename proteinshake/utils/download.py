@@ -0,0 +1,196 @@
+import os, time, threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter, Retry
+from proteinshake.utils import progressbar
+
+class TokenBucket():
+    """ A thread-safe token bucket rate limiter. Tokens are refilled continuously at `rate` per second up to `capacity`, and every request takes one token, waiting if none is left. This allows short bursts while keeping the average request rate at `rate`.
+
+    Parameters
+    ----------
+    rate: float
+        The number of tokens added per second.
+    capacity: int, optional
+        The maximum number of tokens. Defaults to `rate`, i.e. bursts of up to one second worth of requests.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if not capacity is None else max(rate, 1)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """ Takes one token, blocking until one is available.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class BulkDownloader():
+    """ Downloads many files concurrently over a single pooled HTTP session. Connections are kept alive and reused across requests, so that fetching many small files is bound by bandwidth rather than by connection and TLS setup. The number of concurrent requests is limited by `max_concurrency`, and the request rate optionally by a token bucket (:class:`TokenBucket`). Failed requests (connection errors and 429/5xx responses) are retried with exponential backoff, respecting `Retry-After` headers.
+
+    Parameters
+    ----------
+    max_concurrency: int, default 20
+        The maximum number of concurrent requests, which is also the size of the connection pool.
+    rate_limit: float, optional
+        The maximum average number of requests per second. Not limited if `None`.
+    retries: int, default 5
+        The number of retries per request.
+    backoff_factor: float, default 0.25
+        The backoff factor of the retries. The n-th retry waits `backoff_factor * 2**(n-1)` seconds.
+    timeout: float, default 60
+        The connect and read timeout of each request in seconds.
+    cache: HTTPCache, optional
+        If given, requests are sent through this HTTP cache (see :class:`HTTPCache`), except for streamed downloads.
+    """
+
+    def __init__(self, max_concurrency=20, rate_limit=None, retries=5, backoff_factor=0.25, timeout=60, cache=None):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.cache = cache
+        self.bucket = TokenBucket(rate_limit) if not rate_limit is None else None
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=None, respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=max_concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': 'XY'})
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def send(self, method, url, **kwargs):
+        """ Sends a request to the server, waiting for the rate limit.
+        """
+        if not self.bucket is None:
+            self.bucket.acquire()
+        return self.session.request(method, url, timeout=self.timeout, **kwargs)
+
+    def request(self, method, url, cacheable=None, **kwargs):
+        """ Sends a request through the session, and through the cache unless the response is streamed.
+
+        Parameters
+        ----------
+        method: str
+            The HTTP method.
+        url: str
+            The url to request.
+        cacheable: bool, optional
+            Whether the response is cached, see :meth:`HTTPCache.request`. Defaults to `True` for GET and HEAD requests.
+        **kwargs:
+            Passed on to :meth:`requests.Session.request`.
+
+        Returns
+        -------
+        Response
+            The response. Raises `requests.HTTPError` on error status codes.
+        """
+        if self.cache is None or kwargs.get('stream', False):
+            response = self.send(method, url, **kwargs)
+        else:
+            response = self.cache.request(method, url, send=self.send, cacheable=cacheable, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def get(self, url, **kwargs):
+        """ Sends a GET request through the session.
+
+        Parameters
+        ----------
+        url: str
+            The url to request.
+        **kwargs:
+            Passed on to :meth:`requests.Session.get`.
+
+        Returns
+        -------
+        Response
+            The response. Raises `requests.HTTPError` on error status codes.
+        """
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, cacheable=False, **kwargs):
+        """ Sends a POST request through the session. Only use it for idempotent requests (such as queries), as failed requests are retried.
+
+        Parameters
+        ----------
+        url: str
+            The url to request.
+        cacheable: bool, default False
+            Whether the response is cached, keyed on the request body. Only set it for queries without side effects.
+        **kwargs:
+            Passed on to :meth:`requests.Session.post`.
+
+        Returns
+        -------
+        Response
+            The response. Raises `requests.HTTPError` on error status codes.
+        """
+        return self.request('POST', url, cacheable=cacheable, **kwargs)
+
+    def download(self, url, out_path, chunk_size=1024*1024):
+        """ Downloads a file. The file is written to `out_path + '.part'` and only renamed on success, such that a failed download never leaves a truncated file.
+
+        Parameters
+        ----------
+        url: str
+            The url to download.
+        out_path: str
+            Path to save the downloaded file. If it is a directory, the file is saved under the url basename.
+        chunk_size: int, default 1048576
+            The chunk size of the download.
+
+        Returns
+        -------
+        str
+            The path of the downloaded file.
+        """
+        if os.path.isdir(out_path):
+            out_path = f'{out_path}/{os.path.basename(url)}'
+        with self.get(url, stream=True) as response:
+            with open(out_path+'.part', 'wb') as file:
+                for data in response.iter_content(chunk_size=chunk_size):
+                    file.write(data)
+        os.replace(out_path+'.part', out_path)
+        return out_path
+
+    def map(self, function, items, desc='Downloading', verbosity=2):
+        """ Applies a function to all items on `max_concurrency` threads, typically a function that calls :meth:`get` or :meth:`download`.
+
+        Parameters
+        ----------
+        function: function
+            The function to apply to each item.
+        items: list
+            The items.
+        desc: str, default 'Downloading'
+            The description of the progress bar.
+        verbosity: int, default 2
+            The verbosity level of the progress bar.
+
+        Returns
+        -------
+        list
+            The results, in the order of `items`.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            return list(progressbar(executor.map(function, items), desc=desc, total=len(items), verbosity=verbosity))
+
+    def close(self):
+        """ Closes the session and its connections.
+        """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
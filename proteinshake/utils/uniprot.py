@@ -1,60 +1,104 @@
-import requests, re, io, time
-from requests.adapters import HTTPAdapter, Retry
+import re, io, time, os, hashlib
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
-from proteinshake.utils import progressbar
-
-def uniprot_query(query, columns='', verbosity=2):
-    columns = 'accession,'+columns
-    re_next_link = re.compile(r'<(.+)>; rel="next"')
-    retries = Retry(total=5, backoff_factor=0.25, status_forcelist=[500, 502, 503, 504])
-    session = requests.Session()
-    session.mount("https://", HTTPAdapter(max_retries=retries))
-    def get_next_link(headers):
-        if "Link" in headers:
-            match = re_next_link.match(headers["Link"])
-            if match:
-                return match.group(1)
-    def get_batch(batch_url):
-        while batch_url:
-            response = session.get(batch_url)
-            response.raise_for_status()
-            total = response.headers["x-total-results"]
-            yield response, total
-            batch_url = get_next_link(response.headers)
-    url = f'https://rest.uniprot.org/uniprotkb/search?fields={columns}&format=tsv&query={query}&size=500'
-    df = pd.DataFrame()
-    with progressbar(total=100, verbosity=verbosity) as pbar:
-        for batch, total in get_batch(url):
-            pbar.total = int(total)
-            batch = pd.read_csv(io.StringIO(batch.text), sep='\t')
-            df = pd.concat([df,batch])
-            pbar.update(len(batch))
+from proteinshake.utils import progressbar, BulkDownloader, get_http_cache
+
+UNIPROT_SEARCH_URL = 'https://rest.uniprot.org/uniprotkb/search'
+RE_NEXT_LINK = re.compile(r'<(.+)>; rel="next"')
+
+def uniprot_query_pages(query, columns='', page_size=500, downloader=None):
+    """ Streams the results of a UniProtKB query page by page. UniProt paginates with a cursor, so a page can only be requested once the response of the previous one has arrived. The next page is therefore requested in the background right away, while the current page is being parsed and consumed.
+
+    Parameters
+    ----------
+    query: str
+        The UniProtKB query.
+    columns: str, default ''
+        Comma-separated list of the return fields, in addition to the accession.
+    page_size: int, default 500
+        The number of entries per page.
+    downloader: BulkDownloader, optional
+        The pooled session to use for the requests. If not given, a new one is created that sends the requests through the HTTP cache (see :class:`HTTPCache`).
+
+    Returns
+    -------
+    generator
+        Tuples of the page as a DataFrame and the total number of results.
+    """
+    session = BulkDownloader(max_concurrency=2, cache=get_http_cache()) if downloader is None else downloader
+    url = f'{UNIPROT_SEARCH_URL}?fields=accession,{columns}&format=tsv&query={query}&size={page_size}'
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(session.get, url)
+            while not future is None:
+                response = future.result()
+                match = RE_NEXT_LINK.match(response.headers.get('Link', ''))
+                future = executor.submit(session.get, match.group(1)) if match else None
+                yield pd.read_csv(io.StringIO(response.text), sep='\t'), int(response.headers['x-total-results'])
+    finally:
+        if downloader is None:
+            session.close()
+
+def uniprot_query(query, columns='', verbosity=2, cache_dir=None):
+    """ Queries UniProtKB and returns the results as a dictionary of accessions to return fields. The pages are streamed with :meth:`uniprot_query_pages` and concatenated once at the end.
+
+    Parameters
+    ----------
+    query: str
+        The UniProtKB query.
+    columns: str, default ''
+        Comma-separated list of the return fields, in addition to the accession.
+    verbosity: int, default 2
+        The verbosity level of the progress bar.
+    cache_dir: str, optional
+        If given, the results are cached in this directory, keyed on the query and the columns. Repeated queries are then read from the cache instead of UniProt.
+
+    Returns
+    -------
+    dict
+        The return fields of each entry, keyed on the accession.
+    """
+    cache_path = None
+    if not cache_dir is None:
+        key = hashlib.md5(f'{query}|{columns}'.encode('utf-8')).hexdigest()
+        cache_path = f'{cache_dir}/uniprot_{key}.tsv.gz'
+    if not cache_path is None and os.path.exists(cache_path):
+        df = pd.read_csv(cache_path, sep='\t')
+    else:
+        pages = []
+        with progressbar(total=100, verbosity=verbosity) as pbar:
+            for page, total in uniprot_query_pages(query, columns):
+                pbar.total = total
+                pages.append(page)
+                pbar.update(len(page))
+        df = pd.concat(pages)
+        if not cache_path is None:
+            os.makedirs(cache_dir, exist_ok=True)
+            df.to_csv(cache_path+'.tmp', sep='\t', index=False, compression='gzip')
+            os.replace(cache_path+'.tmp', cache_path)
     df = df.set_index('Entry', drop=True).replace(np.nan, None)
     return df.to_dict('index')
 
 
 def uniprot_map(ids, source, target, polling_interval=3):
-    retries = Retry(total=5, backoff_factor=0.25, status_forcelist=[500, 502, 503, 504])
-    session = requests.Session()
-    session.mount("https://", HTTPAdapter(max_retries=retries))
-    response = requests.post(f'https://rest.uniprot.org/idmapping/run',
-        data={'from': source, 'to': target, 'ids': ','.join(ids)},
-    )
-    response.raise_for_status()
-    job_id = response.json()['jobId']
-    while True:
-        response = session.get(f'https://rest.uniprot.org/idmapping/status/{job_id}')
-        response.raise_for_status()
-        response = response.json()
-        if 'jobStatus' in response:
-            if response['jobStatus'] == 'RUNNING': time.sleep(polling_interval)
-            else: raise Exception(response['jobStatus'])
-        elif bool(response['results'] or response['failedIds']):
-            response = session.get(f'https://rest.uniprot.org/idmapping/stream/{job_id}')
+    # not cached, as every run submits a new mapping job, whose results expire on the server
+    with BulkDownloader(max_concurrency=1) as downloader:
+        response = downloader.post(f'https://rest.uniprot.org/idmapping/run',
+            data={'from': source, 'to': target, 'ids': ','.join(ids)},
+        )
+        job_id = response.json()['jobId']
+        stream_url = f'https://rest.uniprot.org/idmapping/stream/{job_id}'
+        while True:
+            response = downloader.send('GET', f'https://rest.uniprot.org/idmapping/status/{job_id}')
             response.raise_for_status()
-            results = response.json()['results']
-            results = {r['from']:r['to'] for r in results[::-1]}
-            mapped_ids = [results[id] if id in results else None for id in ids]
-            return mapped_ids
-
+            response = response.json()
+            if 'jobStatus' in response:
+                if response['jobStatus'] == 'RUNNING': time.sleep(polling_interval)
+                else: raise Exception(response['jobStatus'])
+            elif bool(response['results'] or response['failedIds']):
+                break
+        results = downloader.get(stream_url).json()['results']
+    results = {r['from']:r['to'] for r in results[::-1]}
+    mapped_ids = [results[id] if id in results else None for id in ids]
+    return mapped_ids
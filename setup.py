@@ -9,11 +9,13 @@ install_requires = [
     'rdkit-pypi>=2022.3.3',
     'tqdm>=4.64.0',
     'scikit-learn>=1.1.1',
-    'joblib>=1.2.0',
+    'scipy>=1.6',
+    'joblib>=1.3.0',
     'requests>=2.27.1',
     'fastavro>=1.6.1',
     'freesasa>=2.2.0.post3',
     'goatools>=1.3.1',
+    'msgpack>=1.0.0',
 ]
 test_requires = [
     'pytest',
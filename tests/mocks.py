@@ -0,0 +1,264 @@
+'''
+Mock data, servers and fixtures shared by the tests.
+'''
+
+import unittest, tempfile, os, shutil, glob, tarfile, threading, json, functools, gzip, io, urllib, hashlib
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from collections import defaultdict
+from unittest import mock
+import numpy as np
+import pandas as pd
+import msgpack
+from proteinshake.datasets import EnzymeCommissionDataset
+from proteinshake.datasets.alphafold import AF_DATASET_NAMES
+from proteinshake.utils import HTTPCache, set_http_cache
+
+MOCK_DATA_PATH = os.path.dirname(os.path.realpath(__file__)) + '/mock_data'
+
+def download_mock(self):
+    shutil.copytree(MOCK_DATA_PATH, f'{self.root}/raw/files', dirs_exist_ok=True)
+
+def get_raw_files_mock(self):
+    return glob.glob(f'{self.root}/raw/files/????.pdb')[:self.limit]
+
+def get_id_from_filename_mock(self, filename):
+    return filename[:4]
+
+def af_download_mock(self):
+    # a proteome archive as on the AlphaFold FTP, with PDB, mmCIF and confidence members per model
+    os.makedirs(f'{self.root}/raw/{self.organism}', exist_ok=True)
+    with tarfile.open(f'{self.root}/raw/{self.organism}/{AF_DATASET_NAMES[self.organism]}_{self.version}.tar', 'w') as archive:
+        for path in sorted(glob.glob(f'{MOCK_DATA_PATH}/????.pdb')):
+            name = f'AF-{os.path.basename(path)[:4].upper()}-F1-model_{self.version}'
+            for member in [f'{name}.pdb.gz', f'{name}.cif.gz', f'{name}-confidence_v4.json.gz']:
+                with open(path, 'rb') as file:
+                    data = gzip.compress(file.read())
+                info = tarfile.TarInfo(member)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+
+CIF_FIELDS = {
+    'group_PDB': 'record_name',
+    'id': 'atom_number',
+    'type_symbol': 'element_symbol',
+    'label_alt_id': 'alt_loc',
+    'Cartn_x': 'x_coord',
+    'Cartn_y': 'y_coord',
+    'Cartn_z': 'z_coord',
+    'occupancy': 'occupancy',
+    'B_iso_or_equiv': 'b_factor',
+    'auth_seq_id': 'residue_number',
+    'auth_comp_id': 'residue_name',
+    'auth_asym_id': 'chain_id',
+    'auth_atom_id': 'atom_name',
+    'pdbx_PDB_ins_code': 'insertion',
+}
+
+def write_cif(df, path):
+    lines = ['data_MOCK', '#', 'loop_'] + [f'_atom_site.{field}' for field in CIF_FIELDS] + ['_atom_site.pdbx_PDB_model_num']
+    for row in df.itertuples():
+        values = [str(getattr(row, column)) or '?' for column in CIF_FIELDS.values()] + ['1']
+        lines.append(' '.join(f'"{v}"' if "'" in v else v for v in values))
+    with open(path, 'w') as file:
+        file.write('\n'.join(lines + ['#', '']))
+
+def write_bcif(df, path):
+    def byte_array(data, type):
+        return {'data': np.asarray(data, dtype={3: '<i4', 33: '<f8'}[type]).tobytes(), 'encoding': [{'kind': 'ByteArray', 'type': type}]}
+    def string_array(data):
+        strings = sorted(set(data))
+        offsets = np.cumsum([0] + [len(s) for s in strings])
+        return {'data': np.array([strings.index(s) for s in data], dtype='<i4').tobytes(), 'encoding': [{
+            'kind': 'StringArray', 'stringData': ''.join(strings),
+            'dataEncoding': [{'kind': 'ByteArray', 'type': 3}],
+            'offsets': offsets.astype('<i4').tobytes(), 'offsetEncoding': [{'kind': 'ByteArray', 'type': 3}],
+        }]}
+    def delta_packed(data):
+        deltas = np.diff(data, prepend=data[0])
+        packed = np.concatenate([[127]*(d//127) + [d%127] for d in deltas]).astype('<i1')
+        return {'data': packed.tobytes(), 'encoding': [
+            {'kind': 'Delta', 'origin': int(data[0]), 'srcType': 3},
+            {'kind': 'IntegerPacking', 'byteCount': 1, 'isUnsigned': False, 'srcSize': len(data)},
+            {'kind': 'ByteArray', 'type': 1},
+        ]}
+    columns = []
+    for field, column in CIF_FIELDS.items():
+        if field == 'id':
+            data = delta_packed(df[column].to_numpy())
+        elif df[column].dtype.kind in 'iuf':
+            data = byte_array(df[column], 3 if df[column].dtype.kind in 'iu' else 33)
+        else:
+            data = string_array(df[column].tolist())
+        columns.append({'name': field, 'data': data, 'mask': None})
+    columns.append({'name': 'pdbx_PDB_model_num', 'data': byte_array([1]*len(df), 3), 'mask': None})
+    category = {'name': '_atom_site', 'columns': columns, 'rowCount': len(df)}
+    with open(path, 'wb') as file:
+        file.write(msgpack.packb({'version': '0.3.0', 'encoder': 'mock', 'dataBlocks': [{'header': 'MOCK', 'categories': [category]}]}))
+
+class FlakyHandler(SimpleHTTPRequestHandler):
+    """ Serves files from a directory, but fails the first request to every path. """
+    requested = set()
+
+    def do_GET(self):
+        if not self.path in self.requested:
+            self.requested.add(self.path)
+            self.send_error(503)
+            return
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+class GraphQLHandler(FlakyHandler):
+    """ Answers RCSB GraphQL polymer entity queries from `{id}.annot.json` files in the served directory. """
+    def do_POST(self):
+        if not self.path in self.requested:
+            self.requested.add(self.path)
+            self.send_error(503)
+            return
+        variables = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['variables']
+        entities = []
+        for entity_id in variables['ids']:
+            path = f'{self.directory}/{entity_id.split("_")[0]}.annot.json'
+            if os.path.exists(path):
+                with open(path) as file:
+                    entities.append({**json.load(file), 'rcsb_id': entity_id})
+        body = json.dumps({'data': {'polymer_entities': entities}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class RangeHandler(SimpleHTTPRequestHandler):
+    """ Serves files from a directory with support for Range requests and ETags (the MD5 of the file), but drops the connection halfway through the first full download of every path. A range is ignored if the If-Range header does not match the ETag. """
+    requested = set()
+    ranges = []
+    if_ranges = []
+
+    def do_HEAD(self):
+        self.send_file(body=False)
+
+    def do_GET(self):
+        self.send_file(body=True)
+
+    def send_file(self, body):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, 'rb') as file:
+            data = file.read()
+        start, end = 0, len(data) - 1
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        if 'If-Range' in self.headers:
+            self.if_ranges.append(self.headers['If-Range'])
+        if 'Range' in self.headers and self.headers.get('If-Range', etag) == etag:
+            self.ranges.append(self.headers['Range'])
+            start, end = self.headers['Range'][len('bytes='):].split('-')
+            start, end = int(start), int(end) if end else len(data) - 1
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        if not body: return
+        if start == 0 and end == len(data) - 1 and not self.path in self.requested:
+            self.requested.add(self.path)
+            self.wfile.write(data[:len(data)//2])
+            self.close_connection = True
+            return
+        self.wfile.write(data[start:end+1])
+
+    def log_message(self, *args):
+        pass
+
+class UniProtHandler(FlakyHandler):
+    """ Answers UniProtKB search requests from `uniprot.tsv` in the served directory, paginated with a cursor. """
+    def do_GET(self):
+        if not self.path in self.requested:
+            self.requested.add(self.path)
+            self.send_error(503)
+            return
+        params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        cursor, size = int(params.get('cursor', [0])[0]), int(params['size'][0])
+        df = pd.read_csv(f'{self.directory}/uniprot.tsv', sep='\t')
+        body = df.iloc[cursor:cursor+size].to_csv(sep='\t', index=False).encode()
+        self.send_response(200)
+        self.send_header('x-total-results', str(len(df)))
+        if cursor + size < len(df):
+            self.send_header('Link', f'<http://{self.headers["Host"]}/search?size={size}&cursor={cursor+size}>; rel="next"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class LoggingHandler(SimpleHTTPRequestHandler):
+    """ Serves files from a directory and logs the requests with their conditional headers. """
+    log = []
+
+    def send_head(self):
+        self.log.append((self.command, self.path, self.headers.get('If-Modified-Since')))
+        return super().send_head()
+
+    def log_message(self, *args):
+        pass
+
+class serve_directory():
+    """ Serves a directory on a local HTTP server. """
+    def __init__(self, path, handler=FlakyHandler):
+        handler = type('Handler', (handler,), {'requested': set(), 'ranges': [], 'if_ranges': [], 'log': []})
+        self.handler = handler
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(handler, directory=path))
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+def scop_download_mock(self):
+    download_mock(self)
+    self.scop = self._parse_scop(f'{self.root}/raw/files/scop.txt')
+
+def pli_download_mock(self):
+    download_mock(self)
+    self.index_data = self.parse_pdbbind_PL_index(f'{self.root}/raw/files/INDEX_refined_data.{self.version}')
+
+def GODag_mock(*args, **kwargs):
+    class DummyTerm:
+        def __init__(self):
+            self.namespace = 'molecular_function'
+    factory = lambda: DummyTerm()
+    return defaultdict(factory)
+
+
+class MockDatasetTestCase(unittest.TestCase):
+    """ Processes an EnzymeCommissionDataset from the mock data once for all tests of a class. The downloads are patched for the whole class, and the HTTP cache is redirected to a temporary directory. """
+
+    @classmethod
+    def setUpClass(self):
+        self.patches = [
+            mock.patch.object(EnzymeCommissionDataset, 'download', download_mock),
+            mock.patch.object(EnzymeCommissionDataset, 'get_raw_files', get_raw_files_mock),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        set_http_cache(HTTPCache(path=self.cache_dir.name))
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = self.tmpdir.name
+        self.ds = EnzymeCommissionDataset(root=self.root, use_precomputed=False, verbosity=0)
+        self.proteins = list(self.ds.proteins())
+
+    @classmethod
+    def tearDownClass(self):
+        for patch in self.patches:
+            patch.stop()
+        set_http_cache(None)
+        self.cache_dir.cleanup()
+        self.tmpdir.cleanup()
@@ -0,0 +1,316 @@
+'''
+Tests processing the datasets from the mock data with local servers, without network access.
+'''
+
+import unittest, tempfile, os, shutil, glob, tarfile, copy, gzip
+from unittest import mock
+import numpy as np
+import pandas as pd
+import freesasa
+from proteinshake.datasets import EnzymeCommissionDataset, AlphaFoldDataset, ProteinLigandDecoysDataset, TMAlignDataset
+from proteinshake.datasets.alphafold import AF_DATASET_NAMES
+from proteinshake.utils import zip_file, list_tar, read_pdb_atoms, load, write_column_release, HTTPCache, set_http_cache
+from .mocks import MOCK_DATA_PATH, MockDatasetTestCase, GraphQLHandler, LoggingHandler, serve_directory, download_mock, get_raw_files_mock, af_download_mock, write_cif, write_bcif
+
+
+class TestLocalDatasets(MockDatasetTestCase):
+
+    def test_random_access(self):
+        for i, protein in enumerate(self.proteins):
+            self.assertEqual(self.ds.get(i), protein)
+            self.assertEqual(self.ds.get_by_id(protein['protein']['ID']), protein)
+        index = load(f'{self.root}/{self.ds.name}.residue.avro.index.json')
+        self.assertLess(len(set(index['offsets'])), len(self.proteins)) # the blocks hold several proteins
+        os.remove(f'{self.root}/{self.ds.name}.residue.avro.index.json')
+        ds = EnzymeCommissionDataset(root=self.root, use_precomputed=False, verbosity=0)
+        self.assertEqual(ds.get(-1), self.proteins[-1])
+        self.assertEqual(load(f'{self.root}/{self.ds.name}.residue.avro.index.json'), index) # the rebuilt index
+
+    def test_columns(self):
+        proteins = list(self.ds.proteins(resolution='atom'))
+        ds = EnzymeCommissionDataset(root=self.root, use_precomputed=False, storage='npy', verbosity=0)
+        for protein, columnar in zip(proteins, ds.proteins(resolution='atom')):
+            self.assertEqual(protein['protein'], columnar['protein'])
+            for key, value in protein['atom'].items():
+                if key in ['x','y','z','SASA']:
+                    np.testing.assert_allclose(value, columnar['atom'][key])
+                else:
+                    self.assertEqual(value, columnar['atom'][key].tolist())
+        self.assertEqual(ds.get_by_id(proteins[3]['protein']['ID'], resolution='atom')['protein'], proteins[3]['protein'])
+        self.assertIsInstance(ds.get(0)['residue']['x'], np.memmap)
+
+    def test_column_release(self):
+        with tempfile.TemporaryDirectory() as served, tempfile.TemporaryDirectory() as remote_tmp:
+            ds = EnzymeCommissionDataset(root=self.root, use_precomputed=False, storage='npy', verbosity=0)
+            ds.columns(resolution='atom')
+            write_column_release(f'{self.root}/{ds.name}.atom.columns', served, f'{ds.name}.atom', shard_size=3)
+            with serve_directory(served, handler=LoggingHandler) as url, mock.patch.object(EnzymeCommissionDataset, 'precomputed_available', lambda self: True):
+                remote = EnzymeCommissionDataset(root=remote_tmp, storage='npy', verbosity=0)
+                remote.repository_url = url
+                attributes = ['x', 'atom_type']
+                proteins = list(remote.proteins(resolution='atom', attributes=attributes))
+                self.assertEqual(sorted(os.listdir(f'{remote_tmp}/{ds.name}.atom.columns')), ['atom_type.npy', 'columns.json', 'offsets.npy', 'protein.json', 'x.npy'])
+                self.assertFalse(os.path.exists(f'{remote_tmp}/{ds.name}.atom.avro'))
+                for protein, expected in zip(proteins, ds.proteins(resolution='atom')):
+                    self.assertEqual(protein['protein'], expected['protein'])
+                    self.assertEqual(list(protein['atom']), attributes)
+                    for key in attributes:
+                        np.testing.assert_array_equal(protein['atom'][key], expected['atom'][key])
+                # the remaining attributes are fetched on demand
+                protein, expected = remote.get(4, resolution='atom'), ds.get(4, resolution='atom')
+                self.assertEqual(set(protein['atom']), set(expected['atom']))
+                for key in expected['atom']:
+                    np.testing.assert_array_equal(protein['atom'][key], expected['atom'][key])
+                self.assertNotIn('fetched', load(f'{remote_tmp}/{ds.name}.atom.columns/columns.json'))
+
+    def test_shards(self):
+        for num_shards in [1, 2, 3, len(self.proteins) + 2]:
+            bounds = self.ds.shard_bounds(num_shards)
+            self.assertEqual((bounds[0], bounds[-1], len(bounds)), (0, len(self.proteins), num_shards + 1))
+            shards = [self.ds.proteins(shard=i, num_shards=num_shards) for i in range(num_shards)]
+            self.assertEqual([len(shard) for shard in shards], list(np.diff(bounds)))
+            self.assertEqual([protein for shard in shards for protein in shard], self.proteins)
+        self.assertRaises(Exception, self.ds.proteins, shard=2, num_shards=2)
+        graphs = self.ds.to_graph(k=3)
+        self.assertEqual(sum(len(list(graphs.shard(i, 2)[0])) for i in range(2)), len(self.proteins))
+        # with a column release, the shards are aligned to the release shards and fetched independently
+        npy = EnzymeCommissionDataset(root=self.root, use_precomputed=False, storage='npy', verbosity=0)
+        npy_bounds = npy.shard_bounds(2)
+        self.assertEqual([p['protein'] for p in npy.proteins(shard=1, num_shards=2)], [p['protein'] for p in self.proteins[npy_bounds[1]:npy_bounds[2]]])
+        with tempfile.TemporaryDirectory() as served, tempfile.TemporaryDirectory() as remote_tmp:
+            write_column_release(f'{self.root}/{self.ds.name}.residue.columns', served, f'{self.ds.name}.residue', shard_size=3)
+            with serve_directory(served, handler=LoggingHandler) as url, mock.patch.object(EnzymeCommissionDataset, 'precomputed_available', lambda self: True):
+                remote = EnzymeCommissionDataset(root=remote_tmp, storage='npy', verbosity=0)
+                remote.repository_url = url
+                release = remote.release_shards()
+                bounds = remote.shard_bounds(2)
+                self.assertTrue(set(bounds) <= set(release))
+                shard = list(remote.proteins(shard=0, num_shards=2, attributes=['x']))
+                self.assertEqual([protein['protein'] for protein in shard], [protein['protein'] for protein in self.proteins[:bounds[1]]])
+                fetched = load(f'{remote_tmp}/{self.ds.name}.residue.columns/columns.json')['fetched']
+                self.assertEqual(fetched, {'x': [i for i in range(len(release) - 1) if release[i] < bounds[1]]})
+
+    def test_parse_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ds = EnzymeCommissionDataset(root=tmp, use_precomputed=False, parse_cache=True, verbosity=0)
+            proteins = list(ds.proteins())
+            os.remove(f'{tmp}/{ds.name}.residue.avro')
+            with mock.patch.object(EnzymeCommissionDataset, 'parse_pdb', side_effect=Exception('parsed again')):
+                ds = EnzymeCommissionDataset(root=tmp, use_precomputed=False, parse_cache=True, verbosity=0)
+            self.assertEqual(list(ds.proteins()), proteins)
+
+    def test_parallel_parse(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            parallel_ds = EnzymeCommissionDataset(root=tmp, use_precomputed=False, n_jobs=2, verbosity=0)
+            self.assertEqual(list(parallel_ds.proteins(resolution='atom')), list(self.ds.proteins(resolution='atom')))
+            self.assertEqual(set(parallel_ds.parse_timings), set(self.ds.parse_timings))
+
+    @unittest.skipUnless(os.path.isdir('/dev/shm'), 'shared memory blocks are not listed')
+    def test_parallel_parse_aborted(self):
+        items = [(path, None) for path in self.ds.get_raw_files()]
+        ds = copy.copy(self.ds)
+        ds.n_jobs, ds.parse_chunk_size = 2, 1
+        before = set(os.listdir('/dev/shm'))
+        # the consumer stops early
+        chunks = ds.parse_chunks(items)
+        self.assertEqual(next(chunks)[0], self.ds.parse_pdb(items[0][0]))
+        chunks.close()
+        self.assertEqual(set(os.listdir('/dev/shm')), before)
+        # a worker fails
+        parse_pdb_timed = EnzymeCommissionDataset.parse_pdb_timed
+        def failing(self, path, data=None):
+            if path == items[2][0]:
+                raise ValueError(path)
+            return parse_pdb_timed(self, path, data=data)
+        with mock.patch.object(EnzymeCommissionDataset, 'parse_pdb_timed', failing):
+            with self.assertRaises(ValueError):
+                list(ds.parse_chunks(items))
+        self.assertEqual(set(os.listdir('/dev/shm')), before)
+
+    def test_exclude_stages(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ds = EnzymeCommissionDataset(root=tmp, use_precomputed=False, exclude_stages=['sasa'], verbosity=0)
+            protein = next(ds.proteins())
+            self.assertNotIn('SASA', protein['residue'])
+            self.assertIn('x', protein['residue'])
+            self.assertIn('EC', protein['protein'])
+            self.assertEqual(set(ds.parse_timings), {'pdb2df', 'coordinates', 'protein_attributes'})
+
+    def test_native_parser(self):
+        ds = copy.copy(self.ds)
+        for path in ds.get_raw_files() + glob.glob(f'{self.root}/raw/files/*_pocket.pdb'):
+            ds.pdb_parser = 'biopandas'
+            expected = ds.pdb2df(path)
+            ds.pdb_parser = 'native'
+            df = ds.pdb2df(path)
+            pd.testing.assert_frame_equal(df, expected[df.columns])
+
+    def test_compressed_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [shutil.copy(path, tmp) for path in self.ds.get_raw_files()[:3]]
+            with tarfile.open(f'{tmp}/files.tar', 'w') as archive:
+                for path in paths:
+                    zip_file(path)
+                    archive.add(path+'.gz', arcname=os.path.basename(path)+'.gz')
+            members = list_tar(f'{tmp}/files.tar')
+            for path, member in zip(paths, members):
+                expected = self.ds.parse_pdb(path)
+                self.assertEqual(self.ds.parse_pdb(path+'.gz'), expected)
+                self.assertEqual(self.ds.parse_pdb(member), expected)
+
+    def test_cif_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for path in self.ds.get_raw_files()[:3]:
+                atoms = read_pdb_atoms(path)
+                name = f'{tmp}/{os.path.basename(path)[:-4]}'
+                write_cif(atoms, name+'.cif')
+                write_bcif(atoms, name+'.bcif')
+                expected = self.ds.pdb2df(path)
+                for other in [name+'.cif', name+'.bcif']:
+                    df = self.ds.pdb2df(other)
+                    columns = [c for c in df.columns if c != 'segment_id']
+                    pd.testing.assert_frame_equal(df[columns], expected[columns])
+                    protein, expected_protein = self.ds.parse_pdb(other), self.ds.parse_pdb(path)
+                    self.assertEqual(protein['protein'], expected_protein['protein'])
+                    self.assertEqual(protein['residue']['x'], expected_protein['residue']['x'])
+                    np.testing.assert_allclose(protein['residue']['SASA'], expected_protein['residue']['SASA'], atol=1e-6)
+
+    def test_sasa(self):
+        for path in self.ds.get_raw_files():
+            atom_df = self.ds.pdb2df(path)
+            residue_df = atom_df[atom_df['atom_type'] == 'CA']
+            # freesasa writes its warnings to the C-level stderr
+            with tempfile.TemporaryFile() as stderr:
+                saved = os.dup(2)
+                os.dup2(stderr.fileno(), 2)
+                try:
+                    atom_sasa, residue_sasa, residue_rsa = self.ds.compute_sasa(atom_df, residue_df)
+                finally:
+                    os.dup2(saved, 2)
+                    os.close(saved)
+                stderr.seek(0)
+                self.assertEqual(stderr.read(), b'')
+            self.assertEqual(len(atom_sasa), len(atom_df))
+            self.assertEqual(len(residue_sasa), len(residue_df))
+            result = freesasa.calc(freesasa.Structure(path))
+            self.assertAlmostEqual(sum(a for a in atom_sasa if a > 0), result.totalArea())
+            residue_areas = result.residueAreas()
+            for sasa, number, insertion, chain in zip(residue_sasa, residue_df['residue_number'], residue_df['insertion'], residue_df['chain_id']):
+                self.assertAlmostEqual(sasa, residue_areas[chain][f'{number}{insertion}'].total)
+
+
+class TestDownloadedDatasets(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        set_http_cache(HTTPCache(path=self.cache_dir.name))
+
+    def tearDown(self):
+        set_http_cache(None)
+        self.cache_dir.cleanup()
+
+    def test_rcsb_download(self):
+        with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as server_root:
+            os.makedirs(f'{server_root}/download')
+            for id in ['0000', '0001', '0002']:
+                shutil.copy(f'{MOCK_DATA_PATH}/{id}.pdb', f'{server_root}/download/{id}.pdb')
+                zip_file(f'{server_root}/download/{id}.pdb')
+                shutil.copy(f'{MOCK_DATA_PATH}/{id}.annot.json', f'{server_root}/{id}.annot.json')
+            os.remove(f'{server_root}/download/0002.pdb.gz')
+            with serve_directory(server_root, handler=GraphQLHandler) as url, mock.patch.multiple(EnzymeCommissionDataset, rcsb_data_url=url, rcsb_files_url=url, rcsb_models_url=url, annotation_batch_size=2):
+                ds = EnzymeCommissionDataset(root=tmp, use_precomputed=False, from_list=['0000', '0001', '0002', 'XXXX'], max_requests=2, verbosity=0)
+            self.assertEqual(sorted(os.listdir(f'{tmp}/raw/files')), ['0000.pdb.gz', '0001.pdb.gz'])
+            self.assertEqual(sorted(load(f'{tmp}/raw/annotations.json')), ['0000', '0001', '0002'])
+            self.assertEqual(sorted(p['protein']['ID'] for p in ds.proteins()), ['0000', '0001'])
+            for protein in ds.proteins():
+                self.assertEqual(protein['protein']['EC'], load(f'{MOCK_DATA_PATH}/{protein["protein"]["ID"]}.annot.json')['rcsb_polymer_entity']['rcsb_ec_lineage'][-1]['id'])
+
+    def test_tm_plain_pdb(self):
+        def download(self):
+            # the structures as RCSB serves them, in all formats
+            os.makedirs(f'{self.root}/raw/files', exist_ok=True)
+            for id, extension in zip(['0000', '0001', '0002', '0003'], ['pdb', 'pdb.gz', 'cif.gz', 'bcif']):
+                atoms, path = read_pdb_atoms(f'{MOCK_DATA_PATH}/{id}.pdb'), f'{self.root}/raw/files/{id}.{extension}'
+                if extension.startswith('pdb'):
+                    shutil.copy(f'{MOCK_DATA_PATH}/{id}.pdb', f'{self.root}/raw/files/{id}.pdb')
+                elif extension.startswith('cif'):
+                    write_cif(atoms, f'{self.root}/raw/files/{id}.cif')
+                else:
+                    write_bcif(atoms, path)
+                if extension.endswith('.gz'):
+                    zip_file(path[:-3])
+        aligned = []
+        def tmalign(pdb1, pdb2):
+            aligned.extend([pdb1, pdb2])
+            for path in [pdb1, pdb2]:
+                self.assertTrue(path.endswith('.pdb') and os.path.isfile(path))
+                id = os.path.basename(path)[:4]
+                expected = read_pdb_atoms(f'{MOCK_DATA_PATH}/{id}.pdb')
+                np.testing.assert_allclose(read_pdb_atoms(path)[['x_coord', 'y_coord', 'z_coord']], expected[['x_coord', 'y_coord', 'z_coord']])
+            return {'TM1': 1., 'TM2': 1., 'RMSD': 0., 'GDT': 1., 'LDDT': 1.}
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(TMAlignDataset, 'download', download), mock.patch('proteinshake.datasets.tm_align.tmalign_wrapper', tmalign):
+            ds = TMAlignDataset(root=tmp, use_precomputed=False, verbosity=0)
+            self.assertEqual(len(set(aligned)), 4)
+            self.assertEqual(ds.tm_score('0000', '0003'), 1.)
+            self.assertFalse(any(os.path.exists(path) for path in aligned if not path.startswith(f'{tmp}/raw/files/'))) # the converted files are removed
+
+    @mock.patch.object(AlphaFoldDataset, 'download', af_download_mock)
+    def test_af_streaming(self):
+        with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as parallel_tmp:
+            organism = 'methanocaldococcus_jannaschii'
+            ds = AlphaFoldDataset(root=tmp, organism=organism, use_precomputed=False, verbosity=0)
+            parallel_ds = AlphaFoldDataset(root=parallel_tmp, organism=organism, use_precomputed=False, n_jobs=2, verbosity=0)
+            paths = ds.get_raw_files()
+            streamed = list(ds.iter_raw_files())
+            self.assertEqual([path for path, _ in streamed], paths)
+            self.assertEqual(os.listdir(f'{tmp}/raw/{organism}'), [f'{AF_DATASET_NAMES[organism]}_v4.tar'])
+            self.assertEqual([ds.parse_pdb(path, data=data) for path, data in streamed], [ds.parse_pdb(path) for path in paths])
+            proteins = list(ds.proteins(resolution='atom'))
+            self.assertGreater(len(proteins), 0)
+            self.assertEqual(list(parallel_ds.proteins(resolution='atom')), proteins)
+            # the confidence is stored in the B-factor column
+            for (path, data), protein in zip(streamed, ds.proteins()):
+                residue_df = ds.pdb2df(path, data=data).query('atom_type == "CA"')
+                np.testing.assert_allclose(protein['residue']['pLDDT'], residue_df['b_factor'], rtol=1e-6)
+            self.assertIn('pLDDT', proteins[0]['atom'])
+
+    @mock.patch.object(ProteinLigandDecoysDataset, 'download', download_mock)
+    @mock.patch.object(ProteinLigandDecoysDataset, 'get_raw_files', get_raw_files_mock)
+    def test_decoys_molecules(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ds = ProteinLigandDecoysDataset(root=tmp, use_precomputed=False, verbosity=0)
+            for protein in ds.proteins():
+                self.assertNotIn('ligands_smiles', protein['protein'])
+                for mode in ['ligands', 'decoys']:
+                    with open(f'{tmp}/raw/files/{mode}_{protein["protein"]["ID"]}.smi') as file:
+                        expected = [line.split() for line in file if line.strip()]
+                    smiles, ids = ds.molecules(protein, mode)
+                    self.assertEqual(list(zip(smiles, ids)), [tuple(line) for line in expected])
+                    self.assertEqual(protein['protein'][f'num_{mode}'], len(expected))
+
+    @mock.patch.object(ProteinLigandDecoysDataset, 'download', download_mock)
+    @mock.patch.object(ProteinLigandDecoysDataset, 'get_raw_files', get_raw_files_mock)
+    def test_decoys_release(self):
+        with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as served, tempfile.TemporaryDirectory() as remote_tmp:
+            ds = ProteinLigandDecoysDataset(root=tmp, use_precomputed=False, verbosity=0)
+            # the release holds the avro file and the additional files, compressed
+            for filename in [f'{ds.name}.residue.avro'] + ds.additional_files:
+                with open(f'{tmp}/{filename}', 'rb') as file, gzip.open(f'{served}/{filename}.gz', 'wb') as compressed:
+                    compressed.write(file.read())
+            with serve_directory(served, handler=LoggingHandler) as url, mock.patch.object(ProteinLigandDecoysDataset, 'precomputed_available', lambda self: True):
+                remote = ProteinLigandDecoysDataset(root=remote_tmp, verbosity=0)
+                remote.repository_url = url
+                remote.download_precomputed()
+                proteins = list(remote.proteins())
+                self.assertEqual(len(proteins), len(list(ds.proteins())))
+                for protein, expected in zip(proteins, ds.proteins()):
+                    self.assertEqual(protein['protein']['ID'], expected['protein']['ID'])
+                    for mode in ['ligands', 'decoys']:
+                        smiles, ids = remote.molecules(protein, mode)
+                        self.assertEqual(len(smiles), protein['protein'][f'num_{mode}'])
+                        self.assertEqual((smiles, ids), ds.molecules(expected, mode))
+            self.assertTrue(all(os.path.exists(f'{remote_tmp}/{filename}') for filename in ds.additional_files))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -23,12 +23,81 @@ class TestFrameworks(unittest.TestCase):
         loader = DataLoader(graphs)
         x = next(iter(loader))
 
+    def test_graph_pyg_collated(self):
+        import torch
+        from torch_geometric.data import Batch
+        graphs = self.ds.to_graph(k=5).pyg()
+        collated = self.ds.to_graph(k=5).pyg(collated=True)
+        self.assertTrue(os.path.exists(f'{collated.path}/collated.pt'))
+        self.assertNotEqual(collated.path, graphs.path)
+        self.assertFalse(os.path.exists(f'{graphs.path}/collated.pt'))
+        self.assertFalse(os.path.exists(f'{collated.path}/index.npy'))
+        self.assertEqual(len(collated), len(graphs))
+        def assert_data_equal(data, expected):
+            for key in ['x', 'edge_index', 'edge_attr']:
+                self.assertEqual(data[key].dtype, expected[key].dtype)
+                self.assertTrue(torch.equal(data[key], expected[key]))
+        for i in range(len(graphs)):
+            (data, protein_dict), (expected, expected_protein_dict) = collated[i], graphs[i]
+            assert_data_equal(data, expected)
+            self.assertEqual(protein_dict['protein']['ID'], expected_protein_dict['protein']['ID'])
+        assert_data_equal(collated[-1][0], graphs[len(graphs) - 1][0])
+        assert_data_equal(collated[-len(graphs)][0], graphs[0][0])
+        batch, protein_dicts = collated.get_batch([2, -1, 0])
+        self.assertIsInstance(batch, Batch)
+        self.assertEqual(batch.num_graphs, 3)
+        self.assertEqual([p['protein']['ID'] for p in protein_dicts], [graphs[i][1]['protein']['ID'] for i in [2, len(graphs) - 1, 0]])
+        self.assertTrue(torch.equal(batch.x, torch.cat([graphs[i][0].x for i in [2, len(graphs) - 1, 0]])))
+        mtime = os.path.getmtime(f'{collated.path}/collated.pt')
+        reopened = self.ds.to_graph(k=5).pyg(collated=True)
+        self.assertEqual(os.path.getmtime(f'{collated.path}/collated.pt'), mtime)
+        self.assertEqual(len(reopened), len(graphs))
+        for i in range(len(graphs)):
+            assert_data_equal(reopened[i][0], graphs[i][0])
+
     def test_graph_dgl(self):
         from dgl.dataloading import GraphDataLoader as DataLoader
         graphs = self.ds.to_graph(k=5).dgl()
         loader = DataLoader(graphs)
         x = next(iter(loader))
 
+    def test_graph_pyg_batch(self):
+        import torch
+        from torch_geometric.data import Batch
+        batches = []
+        graphs = self.ds.to_graph(k=5).pyg(batch_transform=lambda batch: batches.append(batch) or batch)
+        batch, protein_dicts = graphs.get_batch([2, 0, 2])
+        self.assertEqual(len(batches), 1)
+        self.assertIsInstance(batch, Batch)
+        self.assertEqual(batch.num_graphs, 3)
+        items = graphs.get_batch([2, 0, 2], collate=False)
+        expected = graphs[[2, 0, 2]]
+        self.assertEqual(len(batches), 1)
+        self.assertEqual([p['protein']['ID'] for p in protein_dicts], [p['protein']['ID'] for _, p in expected])
+        self.assertTrue(torch.equal(batch.x, torch.cat([data.x for data, _ in expected])))
+        for (data, protein_dict), (expected_data, expected_protein_dict) in zip(items, expected):
+            self.assertEqual(protein_dict['protein']['ID'], expected_protein_dict['protein']['ID'])
+            self.assertTrue(torch.equal(data.x, expected_data.x))
+            self.assertTrue(torch.equal(data.edge_index, expected_data.edge_index))
+
+    def test_graph_dgl_batch(self):
+        import dgl, torch
+        batches = []
+        graphs = self.ds.to_graph(k=5).dgl(batch_transform=lambda batch: batches.append(batch) or batch)
+        batch, protein_dicts = graphs.get_batch([2, 0, 2])
+        self.assertEqual(len(batches), 1)
+        self.assertIsInstance(batch, dgl.DGLGraph)
+        self.assertEqual(batch.batch_size, 3)
+        items = graphs.get_batch([2, 0, 2], collate=False)
+        expected = graphs[[2, 0, 2]]
+        self.assertEqual(len(batches), 1)
+        self.assertEqual([p['protein']['ID'] for p in protein_dicts], [p['protein']['ID'] for _, p in expected])
+        self.assertEqual(batch.batch_num_nodes().tolist(), [data.num_nodes() for data, _ in expected])
+        for (data, protein_dict), (expected_data, expected_protein_dict) in zip(items, expected):
+            self.assertEqual(protein_dict['protein']['ID'], expected_protein_dict['protein']['ID'])
+            self.assertEqual(data.num_edges(), expected_data.num_edges())
+            self.assertTrue(torch.equal(data.edata['edge_weight'], expected_data.edata['edge_weight']))
+
     def test_graph_nx(self):
         graphs = self.ds.to_graph(k=5).nx()
         x = graphs[0]
@@ -2,44 +2,28 @@
 Tests all downloads with 'use_precomputed=False'. The number of downloaded files and the number of parsed files is patched to a small number where possible. However, most datasets require downloading one large file, which takes time. Hence removed from GitHub testing CI (by not naming it according to pytest convention).
 '''
 
-import unittest, tempfile, os, shutil, glob
-from collections import defaultdict
+import unittest, tempfile
 from unittest import mock
 from proteinshake.datasets import *
+from proteinshake.utils import HTTPCache, set_http_cache
+from .mocks import download_mock, get_raw_files_mock, scop_download_mock, pli_download_mock, GODag_mock
 
-def download_mock(self):
-    mock_data_path = os.path.dirname(os.path.realpath(__file__)) + '/mock_data'
-    shutil.copytree(mock_data_path, f'{self.root}/raw/files', dirs_exist_ok=True)
-
-def get_raw_files_mock(self):
-    return glob.glob(f'{self.root}/raw/files/????.pdb')[:self.limit]
-
-def get_id_from_filename_mock(self, filename):
-    return filename[:4]
-
-def scop_download_mock(self):
-    download_mock(self)
-    self.scop = self._parse_scop(f'{self.root}/raw/files/scop.txt')
-
-def pli_download_mock(self):
-    download_mock(self)
-    self.index_data = self.parse_pdbbind_PL_index(f'{self.root}/raw/files/INDEX_refined_data.{self.version}')
+class TestDownload(unittest.TestCase):
 
-def GODag_mock(*args, **kwargs):
-    class DummyTerm:
-        def __init__(self):
-            self.namespace = 'molecular_function'
-    factory = lambda: DummyTerm()
-    return defaultdict(factory)
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        set_http_cache(HTTPCache(path=self.cache_dir.name))
 
-class TestDownload(unittest.TestCase):
+    def tearDown(self):
+        set_http_cache(None)
+        self.cache_dir.cleanup()
 
     @mock.patch.object(ProteinLigandInterfaceDataset, 'download', pli_download_mock)
     @mock.patch.object(ProteinLigandInterfaceDataset, 'get_raw_files', get_raw_files_mock)
     def test_protein_ligand(self):
         with tempfile.TemporaryDirectory() as tmp:
             ds = ProteinLigandInterfaceDataset(root=tmp, use_precomputed=False, verbosity=2)
-    
+
     @mock.patch.object(ProteinProteinInterfaceDataset, 'download', download_mock)
     @mock.patch.object(ProteinProteinInterfaceDataset, 'get_raw_files', get_raw_files_mock)
     def test_protein_protein(self):
@@ -0,0 +1,105 @@
+'''
+Tests the construction of the representations and their conversion and storage with the framework datasets, on the mock data.
+'''
+
+import unittest, tempfile, os, shutil, glob, functools, pickle
+from unittest import mock
+import numpy as np
+from sklearn.neighbors import kneighbors_graph, radius_neighbors_graph
+from proteinshake.frameworks.dataset import FrameworkDataset
+from proteinshake.representations.graph import neighbor_graphs, construct_graphs
+from proteinshake.representations.point import construct_points
+from proteinshake.utils import save, fx2str
+from .mocks import MockDatasetTestCase
+
+
+class TestRepresentations(MockDatasetTestCase):
+
+    def test_graph_construction(self):
+        for resolution, eps in [('residue', 8), ('atom', 4.5)]:
+            coords = [np.stack([p[resolution]['x'], p[resolution]['y'], p[resolution]['z']], axis=1) for p in self.ds.proteins(resolution=resolution)]
+            coords += [coords[0][:3], coords[0][:0]] # a protein smaller than k, and an empty one
+            for weighted_edges in [False, True]:
+                mode = 'distance' if weighted_edges else 'connectivity'
+                for c, adj in zip(coords, neighbor_graphs(coords, 'knn', k=5, weighted_edges=weighted_edges)):
+                    expected = kneighbors_graph(c, n_neighbors=min(len(c) - 1, 5), mode=mode) if len(c) > 1 else adj
+                    self.assertEqual(adj.shape, (len(c), len(c)))
+                    np.testing.assert_allclose(adj.toarray(), expected.toarray())
+                for c, adj in zip(coords[:-1], neighbor_graphs(coords[:-1], 'eps', eps=eps, weighted_edges=weighted_edges)):
+                    np.testing.assert_allclose(adj.toarray(), radius_neighbors_graph(c, radius=eps, mode=mode).toarray())
+        graphs = list(self.ds.to_graph(eps=8, batch_size=4).graphs)
+        self.assertEqual([g.protein_dict for g in graphs], self.proteins)
+        self.assertEqual([g.data[1].nnz for g in graphs], [g.data[1].nnz for g in self.ds.to_graph(eps=8, batch_size=1).graphs])
+
+    def test_parallel_conversion(self):
+        pre_filter = lambda data, protein_dict: len(data) % 2 == 0
+        serial = self.ds.to_point().np(pre_filter=pre_filter)
+        expected = [serial[i] for i in range(len(serial))]
+        shutil.rmtree(serial.path)
+        parallel = self.ds.to_point().np(pre_filter=pre_filter, n_jobs=2, chunk_size=2)
+        self.assertEqual(len(parallel), len(expected))
+        self.assertTrue(0 < len(expected) < len(self.proteins))
+        for i, points in enumerate(expected):
+            np.testing.assert_array_equal(parallel[i], points)
+        shutil.rmtree(parallel.path)
+        # the graphs are constructed on the workers
+        construct = functools.partial(construct_graphs, construction='knn', k=5)
+        with tempfile.TemporaryDirectory() as tmp:
+            serial = FrameworkDataset(iter(self.proteins), len(self.proteins), f'{tmp}/serial', construct=construct, verbosity=0)
+            parallel = FrameworkDataset(iter(self.proteins), len(self.proteins), f'{tmp}/parallel', construct=construct, n_jobs=2, chunk_size=3, verbosity=0)
+            for (serial_data, serial_protein), (parallel_data, parallel_protein) in zip(serial, parallel):
+                self.assertEqual(serial_protein, parallel_protein)
+                np.testing.assert_array_equal(serial_data[1].toarray(), parallel_data[1].toarray())
+
+    def test_framework_storage(self):
+        expected = [(point.data, point.protein_dict) for point in construct_points(self.proteins)]
+        with tempfile.TemporaryDirectory() as tmp:
+            packed = FrameworkDataset(iter(self.proteins), len(self.proteins), f'{tmp}/packed', construct=construct_points, max_file_size=4096, verbosity=0)
+            self.assertGreater(len(glob.glob(f'{tmp}/packed/data.*.bin')), 1)
+            self.assertEqual(len(glob.glob(f'{tmp}/packed/*.pkl')), 1) # only the transforms
+            mapped = pickle.loads(pickle.dumps(FrameworkDataset([], 0, f'{tmp}/packed', mmap=True, verbosity=0)))
+            for dataset in [packed, mapped]:
+                self.assertEqual(len(dataset), len(expected))
+                for (data, protein_dict), (expected_data, expected_protein_dict) in zip(dataset, expected):
+                    np.testing.assert_array_equal(data, expected_data)
+                    self.assertEqual(protein_dict, expected_protein_dict)
+            # batches are read in bulk, in the order of the storage
+            indices = [3, 0, 3, 1, 2]
+            with mock.patch('os.pread', side_effect=os.pread) as pread:
+                batch = packed.get_batch(indices)
+            self.assertEqual(pread.call_count, len(set(packed.index[indices, 0]))) # one read per data file, as the items are adjacent
+            for (data, protein_dict), i in zip(batch, indices):
+                np.testing.assert_array_equal(data, expected[i][0])
+                self.assertEqual(protein_dict, expected[i][1])
+            self.assertEqual(len(packed[indices + [-1]]), len(indices) + 1)
+            self.assertRaises(IndexError, packed.get_batch, [len(expected)])
+            # datasets stored as one pickle file per item are packed on first access
+            os.makedirs(f'{tmp}/legacy')
+            for i, item in enumerate(expected):
+                save(item, f'{tmp}/legacy/{i}.pkl')
+            save(len(expected), f'{tmp}/legacy/size.pkl')
+            save(fx2str(None) + fx2str(None), f'{tmp}/legacy/transforms.pkl')
+            migrated = FrameworkDataset([], 0, f'{tmp}/legacy', verbosity=0)
+            self.assertEqual(sorted(os.listdir(f'{tmp}/legacy')), ['data.0.bin', 'index.npy', 'transforms.pkl'])
+            np.testing.assert_array_equal(migrated[len(expected) - 1][0], expected[-1][0])
+
+    def test_batch(self):
+        batches = []
+        voxels = self.ds.to_voxel().np(batch_transform=lambda batch: batches.append(batch) or batch)
+        batch = voxels.get_batch([2, 0, 2])
+        self.assertEqual(len(batches), 1) # once per batch, instead of the per-item transform
+        self.assertEqual(len(batch), 3)
+        self.assertEqual([protein_dict['protein']['ID'] for _, protein_dict in batch], [self.proteins[i]['protein']['ID'] for i in [2, 0, 2]])
+        items = voxels.get_batch([2, 0, 2], collate=False)
+        self.assertEqual(len(batches), 1)
+        for item, expected, (data, _) in zip(items, voxels[[2, 0, 2]], batch):
+            np.testing.assert_array_equal(item, expected) # the per-item transform returns the data only
+            np.testing.assert_array_equal(item, data)
+        for item, i in zip(items, [2, 0, 2]):
+            np.testing.assert_array_equal(item, voxels[i])
+        self.assertEqual(voxels.get_batch([]), [])
+        self.assertRaises(IndexError, voxels.get_batch, [0, len(voxels)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+'''
+Tests the input/output and download utilities against local servers and the mock data.
+'''
+
+import unittest, tempfile, os, glob, time, hashlib, gzip
+from unittest import mock
+import numpy as np
+import pandas as pd
+import requests
+from proteinshake.utils import read_pdb_atoms, write_pdb_atoms, download_url, BulkDownloader, TokenBucket, HTTPCache, set_http_cache, uniprot_query, uniprot_query_pages
+from .mocks import MOCK_DATA_PATH, RangeHandler, UniProtHandler, LoggingHandler, serve_directory
+
+
+class TestUtils(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        set_http_cache(HTTPCache(path=self.cache_dir.name))
+
+    def tearDown(self):
+        set_http_cache(None)
+        self.cache_dir.cleanup()
+
+    def test_bulk_downloader(self):
+        with tempfile.TemporaryDirectory() as tmp, serve_directory(MOCK_DATA_PATH) as url:
+            files = sorted(os.path.basename(path) for path in glob.glob(f'{MOCK_DATA_PATH}/*.pdb'))
+            with BulkDownloader(max_concurrency=4, backoff_factor=0.01) as downloader:
+                downloader.map(lambda file: downloader.download(f'{url}/{file}', tmp), files, verbosity=0)
+                with self.assertRaises(Exception):
+                    downloader.get(f'{url}/missing.pdb')
+            for file in files:
+                with open(f'{tmp}/{file}') as downloaded, open(f'{MOCK_DATA_PATH}/{file}') as original:
+                    self.assertEqual(downloaded.read(), original.read())
+            self.assertEqual(glob.glob(f'{tmp}/*.part'), [])
+        bucket, start = TokenBucket(rate=50, capacity=1), time.monotonic()
+        for _ in range(11):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_download_url(self):
+        with open(f'{MOCK_DATA_PATH}/0000.pdb', 'rb') as file:
+            data = file.read()
+        md5 = hashlib.md5(data).hexdigest()
+        server = serve_directory(MOCK_DATA_PATH, handler=RangeHandler)
+        with tempfile.TemporaryDirectory() as tmp, server as url:
+            with self.assertRaises(Exception): # the connection drops halfway
+                download_url(f'{url}/0000.pdb', tmp, verbosity=0, chunk_size=1000)
+            self.assertFalse(os.path.exists(f'{tmp}/0000.pdb'))
+            self.assertGreater(os.path.getsize(f'{tmp}/0000.pdb.part'), 0)
+            part_size = os.path.getsize(f'{tmp}/0000.pdb.part')
+            download_url(f'{url}/0000.pdb', tmp, verbosity=0, checksum=f'md5:{md5}') # resumes
+            self.assertEqual(server.handler.ranges, [f'bytes={part_size}-'])
+            self.assertEqual(server.handler.if_ranges, [f'"{md5}"'])
+            self.assertFalse(os.path.exists(f'{tmp}/0000.pdb.part.validator'))
+            with open(f'{tmp}/0000.pdb', 'rb') as file:
+                self.assertEqual(file.read(), data)
+            self.assertFalse(os.path.exists(f'{tmp}/0000.pdb.part'))
+            download_url(f'{url}/0000.pdb', f'{tmp}/segmented.pdb', verbosity=0, chunk_size=10000, segments=4)
+            with open(f'{tmp}/segmented.pdb', 'rb') as file:
+                self.assertEqual(file.read(), data)
+            with self.assertRaises(IOError):
+                download_url(f'{url}/0001.pdb', tmp, verbosity=0, checksum=f'md5:{md5}')
+            self.assertFalse(os.path.exists(f'{tmp}/0001.pdb'))
+
+    def test_download_changed(self):
+        with open(f'{MOCK_DATA_PATH}/0000.pdb', 'rb') as file:
+            data = file.read()
+        with tempfile.TemporaryDirectory() as served, tempfile.TemporaryDirectory() as tmp:
+            with open(f'{served}/0000.pdb', 'wb') as file:
+                file.write(data)
+            server = serve_directory(served, handler=RangeHandler)
+            with server as url:
+                with self.assertRaises(Exception): # the connection drops halfway
+                    download_url(f'{url}/0000.pdb', tmp, verbosity=0, chunk_size=1000)
+                with open(f'{served}/0000.pdb', 'wb') as file:
+                    file.write(data[::-1])
+                download_url(f'{url}/0000.pdb', tmp, verbosity=0) # the range does not match the new file
+                self.assertEqual(server.handler.ranges, [])
+                self.assertEqual(len(server.handler.if_ranges), 1)
+                with open(f'{tmp}/0000.pdb', 'rb') as file:
+                    self.assertEqual(file.read(), data[::-1])
+                # segments of the previous version are discarded
+                os.remove(f'{tmp}/0000.pdb')
+                with open(f'{tmp}/0000.pdb.part.0', 'wb') as file:
+                    file.write(data[:100])
+                with open(f'{tmp}/0000.pdb.part.validator', 'w') as file:
+                    file.write('"outdated"')
+                download_url(f'{url}/0000.pdb', tmp, verbosity=0, chunk_size=1000, segments=4)
+                with open(f'{tmp}/0000.pdb', 'rb') as file:
+                    self.assertEqual(file.read(), data[::-1])
+            self.assertEqual(os.listdir(tmp), ['0000.pdb'])
+
+    def test_download_decompressed(self):
+        with open(f'{MOCK_DATA_PATH}/0000.pdb', 'rb') as file:
+            data = file.read()
+        with tempfile.TemporaryDirectory() as served, tempfile.TemporaryDirectory() as tmp:
+            # a multi-member file, as written by parallel compressors
+            with open(f'{served}/0000.pdb.gz', 'wb') as file:
+                file.write(gzip.compress(data[:len(data)//3]) + gzip.compress(data[len(data)//3:]))
+            server = serve_directory(served, handler=RangeHandler)
+            with server as url:
+                with self.assertRaises(Exception): # the connection drops halfway
+                    download_url(f'{url}/0000.pdb.gz', tmp, verbosity=0, chunk_size=1000, decompress=True)
+                self.assertEqual(sorted(os.listdir(tmp)), ['0000.pdb.gz.part', '0000.pdb.gz.part.validator'])
+                download_url(f'{url}/0000.pdb.gz', tmp, verbosity=0, chunk_size=1000, decompress=True) # resumes
+                self.assertEqual(len(server.handler.ranges), 1)
+            self.assertEqual(os.listdir(tmp), ['0000.pdb'])
+            with open(f'{tmp}/0000.pdb', 'rb') as file:
+                self.assertEqual(file.read(), data)
+
+    def test_http_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(f'{tmp}/small.txt', 'w') as file:
+                file.write('x' * 100)
+            with open(f'{tmp}/large.txt', 'w') as file:
+                file.write('y' * 1000)
+            cache = HTTPCache(path=f'{tmp}/cache', ttl=3600)
+            server = serve_directory(tmp, handler=LoggingHandler)
+            with server as url:
+                response = cache.request('GET', f'{url}/small.txt')
+                self.assertEqual(response.text, 'x' * 100)
+                self.assertEqual(cache.request('GET', f'{url}/small.txt').text, 'x' * 100)
+                self.assertEqual(cache.request('HEAD', f'{url}/missing.txt').status_code, 404)
+                self.assertEqual(cache.request('HEAD', f'{url}/missing.txt').status_code, 404)
+                self.assertEqual(len(server.handler.log), 2) # fresh responses are served without requests
+                # stale responses are revalidated
+                cache.ttl = 0
+                response = cache.request('GET', f'{url}/small.txt')
+                self.assertTrue(response.from_cache)
+                self.assertEqual(response.text, 'x' * 100)
+                self.assertIsNotNone(server.handler.log[-1][2])
+                # the least recently used response is evicted
+                cache.max_size = 1000
+                cache.request('GET', f'{url}/large.txt')
+                self.assertIsNone(cache.lookup('GET', f'{url}/small.txt'))
+                self.assertIsNotNone(cache.lookup('GET', f'{url}/large.txt'))
+            # served offline after the server is gone
+            offline = HTTPCache(path=f'{tmp}/cache', offline=True)
+            self.assertEqual(offline.request('GET', f'{url}/large.txt').text, 'y' * 1000)
+            with self.assertRaises(requests.ConnectionError):
+                offline.request('GET', f'{url}/small.txt')
+            cache = HTTPCache(path=f'{tmp}/entries', ttl=3600, max_entry_size=500)
+            with serve_directory(tmp, handler=LoggingHandler) as url:
+                # responses larger than max_entry_size are not stored and evict nothing
+                cache.request('GET', f'{url}/small.txt')
+                cache.request('GET', f'{url}/large.txt')
+                self.assertIsNone(cache.lookup('GET', f'{url}/large.txt'))
+                self.assertIsNotNone(cache.lookup('GET', f'{url}/small.txt'))
+                # POST requests are only cached on request
+                sent = []
+                send = lambda method, url, **kwargs: sent.append(method) or requests.request('GET', url, **kwargs)
+                for cacheable in [None, None, True, True]:
+                    self.assertEqual(cache.request('POST', f'{url}/small.txt', send=send, cacheable=cacheable, json={'query': 1}).text, 'x' * 100)
+                self.assertEqual(len(sent), 3)
+                self.assertIsNotNone(cache.lookup('POST', f'{url}/small.txt', json={'query': 1}))
+
+    def test_uniprot_query(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            df = pd.DataFrame({'Entry': [f'P{i:05d}' for i in range(1200)], 'Length': range(1200), 'Gene Names': ['gene' if i % 3 else None for i in range(1200)]})
+            df.to_csv(f'{tmp}/uniprot.tsv', sep='\t', index=False)
+            expected = df.set_index('Entry').replace(np.nan, None).to_dict('index')
+            with serve_directory(tmp, handler=UniProtHandler) as url, mock.patch('proteinshake.utils.uniprot.UNIPROT_SEARCH_URL', f'{url}/search'):
+                self.assertEqual([len(page) for page, _ in uniprot_query_pages('reviewed:true', 'length,gene_names')], [500, 500, 200])
+                self.assertEqual(uniprot_query('reviewed:true', 'length,gene_names', verbosity=0, cache_dir=f'{tmp}/cache'), expected)
+            # served from the cache after the server is gone
+            self.assertEqual(uniprot_query('reviewed:true', 'length,gene_names', verbosity=0, cache_dir=f'{tmp}/cache'), expected)
+
+    def test_read_pdb_atoms_malformed(self):
+        expected = read_pdb_atoms(f'{MOCK_DATA_PATH}/0000.pdb')
+        with open(f'{MOCK_DATA_PATH}/0000.pdb', 'r') as file:
+            lines = file.read().split('\n')
+        atoms = [i for i, line in enumerate(lines) if line.startswith('ATOM  ')]
+        lines[atoms[2]] = lines[atoms[2]][:6] + 'A0000' + lines[atoms[2]][11:] # hybrid-36 serial
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(f'{tmp}/malformed.pdb', 'w') as file:
+                file.write('\n'.join(lines))
+            df = read_pdb_atoms(f'{tmp}/malformed.pdb')
+        self.assertTrue(np.isnan(df['atom_number'][2]))
+        self.assertEqual(df['atom_number'].isna().sum(), 1)
+        np.testing.assert_array_equal(df['atom_number'].drop(2), expected['atom_number'].drop(2))
+        self.assertEqual(df['residue_number'].dtype, np.int64)
+        pd.testing.assert_frame_equal(df.drop(columns='atom_number'), expected.drop(columns='atom_number'))
+
+    def test_write_pdb_atoms(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for path in glob.glob(f'{MOCK_DATA_PATH}/*.pdb'):
+                df = read_pdb_atoms(path)
+                write_pdb_atoms(df, f'{tmp}/written.pdb')
+                pd.testing.assert_frame_equal(read_pdb_atoms(f'{tmp}/written.pdb'), df)
+
+
+if __name__ == '__main__':
+    unittest.main()